@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Shared fixtures of the test suite.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Run from the trunk folder with ``python -m pytest tests``. Importing the
+``visuino`` package needs PyQt4, so the tests are skipped without it. The
+ones that create fonts or widgets use the ``qapp`` fixture, on the
+``offscreen`` platform where available (Qt 4 builds for X11 still need a
+display - ``xvfb-run`` will do).
+"""
+import os, sys
+
+import pytest
+
+# the visuino package is on the parent folder of this one
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+@pytest.fixture(scope='session')
+def qapp():
+    ''' () -> QApplication
+    '''
+    QtGui = pytest.importorskip('PyQt4.QtGui')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return QtGui.QApplication.instance() or QtGui.QApplication(['visuino'])
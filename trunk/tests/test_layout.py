@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Tests of visuino.gx.layout.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Tests of the order of the deferred relayouts.
+"""
+import pytest
+
+pytest.importorskip('PyQt4')
+
+from visuino.gx.layout import GxLayoutScheduler
+
+class FakeBlock(object):
+    '''
+    Stands for a GxBlock: logs its updateMetrics() calls and, as the real
+    blocks do, marks its parent as dirty at the end of them.
+    '''
+    def __init__(self, name, scheduler, log, parent=None):
+        self.name, self.scheduler, self.log = name, scheduler, log
+        self.parent = parent
+        self._layout_dirty = False
+        self.on_scene = True
+
+    def parentItem(self):
+        return self.parent
+
+    def scene(self):
+        return self.scheduler if self.on_scene else None
+
+    def updateMetrics(self):
+        self.log.append(self.name)
+        if self.parent is not None:
+            self.scheduler.markDirty(self.parent)
+
+
+@pytest.fixture
+def tree(qapp):
+    '''
+    top
+     +- middle
+         +- leaf_a
+         +- leaf_b
+    '''
+    scheduler, log = GxLayoutScheduler(), []
+    top = FakeBlock('top', scheduler, log)
+    middle = FakeBlock('middle', scheduler, log, top)
+    leaf_a = FakeBlock('leaf_a', scheduler, log, middle)
+    leaf_b = FakeBlock('leaf_b', scheduler, log, middle)
+    return scheduler, log, top, middle, leaf_a, leaf_b
+
+def test_children_before_parents(tree):
+    scheduler, log, top, middle, leaf_a, leaf_b = tree
+    scheduler.markDirty(top)
+    scheduler.markDirty(leaf_a)
+    scheduler.markDirty(middle)
+    scheduler.flush()
+    assert log == ['leaf_a', 'middle', 'top']
+    assert not scheduler.isPending()
+
+def test_each_block_once_per_pass(tree):
+    scheduler, log, top, middle, leaf_a, leaf_b = tree
+    scheduler.markDirty(leaf_a)
+    scheduler.markDirty(leaf_b)
+    scheduler.flush()
+    assert sorted(log[:2]) == ['leaf_a', 'leaf_b']
+    assert log[2:] == ['middle', 'top']
+    assert (scheduler.passes, scheduler.relayouts) == (1, 4)
+
+def test_marking_a_dirty_block_again_does_nothing(tree):
+    scheduler, log, top, middle, leaf_a, leaf_b = tree
+    scheduler.markDirty(middle)
+    scheduler.markDirty(middle)
+    scheduler.flush()
+    assert log == ['middle', 'top']
+
+def test_direct_update_skips_the_scheduled_one(tree):
+    scheduler, log, top, middle, leaf_a, leaf_b = tree
+    scheduler.markDirty(top)
+    top._layout_dirty = False       # as done by a direct updateMetrics()
+    scheduler.flush()
+    assert log == []
+
+def test_blocks_removed_from_the_scene_are_skipped(tree):
+    scheduler, log, top, middle, leaf_a, leaf_b = tree
+    scheduler.markDirty(leaf_a)
+    leaf_a.on_scene = False
+    scheduler.flush()
+    assert log == []
+    assert not leaf_a._layout_dirty
+
+def test_block_marked_after_its_update_goes_to_the_next_pass(tree):
+    scheduler, log, top, middle, leaf_a, leaf_b = tree
+    # top makes leaf_a dirty while being computed, after leaf_a was done
+    def update_top():
+        log.append('top')
+        if log.count('top') == 1:
+            scheduler.markDirty(leaf_a)
+    top.updateMetrics = update_top
+
+    scheduler.markDirty(leaf_a)
+    scheduler.flush()
+    assert log == ['leaf_a', 'middle', 'top']
+    assert scheduler.isPending()
+
+    scheduler.flush()
+    assert log[3:] == ['leaf_a', 'middle', 'top']
+    assert not scheduler.isPending()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Tests of visuino.core.lib_defs.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Tests of the type compatibility rules used for snapping IO blocks.
+"""
+import pytest
+
+pytest.importorskip('PyQt4')
+
+from visuino.core.lib_defs import types_compatible, NO_TYPE
+
+def test_same_type_is_compatible():
+    for t in ('int', 'float', 'boolean', 'String'):
+        assert types_compatible(t, t)
+
+def test_implicit_conversions():
+    assert types_compatible('int', 'boolean')
+    assert types_compatible('long', 'int')
+    assert types_compatible('float', 'int')
+    assert types_compatible('const', 'int')
+
+def test_conversions_are_not_symmetric():
+    assert types_compatible('float', 'int')
+    assert not types_compatible('int', 'float')
+
+def test_incompatible_types():
+    assert not types_compatible('char', 'float')
+    assert not types_compatible('boolean', 'char')
+    assert not types_compatible('String', 'int')
+
+@pytest.mark.parametrize('missing', NO_TYPE)
+def test_missing_type_information_is_compatible(missing):
+    assert types_compatible(missing, 'float')
+    assert types_compatible('int', missing)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Tests of the search filter of visuino.gx.palette.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Tests of GxPaletteLibrary.filterBlocks(), on the palette of the default
+library definitions.
+"""
+import pytest
+
+pytest.importorskip('PyQt4')
+
+@pytest.fixture(scope='module')
+def library(qapp):
+    ''' () -> GxPaletteLibrary
+    '''
+    from visuino.gx.palette import GxViewPalette
+    view = GxViewPalette()
+    yield view.palette_blocks._view
+    view.deleteLater()
+
+@pytest.fixture
+def lib(library):
+    yield library
+    library.filterBlocks('')
+
+def shown(lib):
+    ''' (GxPaletteLibrary) -> set of str
+
+    Names of the blocks currently shown.
+    '''
+    return set(block.definition['name'] for section in lib._sections
+               if section.isVisible() for block in section.blocks
+               if block.isVisible())
+
+def matching(lib, text):
+    ''' (GxPaletteLibrary, str) -> set of str
+
+    Names of the blocks whose name or section title contains 'text'.
+    '''
+    return set(block.definition['name'] for section in lib._sections
+               for block in section.blocks
+               if text in block.definition['name'].lower() or
+                  text in section.title.lower())
+
+def test_shows_only_the_matching_blocks(lib):
+    lib.filterBlocks('read')
+    assert shown(lib) == matching(lib, 'read') == \
+           set(['digitalRead', 'analogRead'])
+
+def test_matches_section_titles_ignoring_case(lib):
+    lib.filterBlocks('  TIME ')
+    assert shown(lib) == set(['delay', 'millis'])
+
+def test_sections_without_matches_are_hidden(lib):
+    lib.filterBlocks('digital')
+    visible = [s.title for s in lib._sections if s.isVisible()]
+    assert visible == ['Digital I/O']
+    assert lib._sections[0].getTotalHeight() > 0
+    assert all(s.getTotalHeight() == 0 for s in lib._sections
+               if not s.isVisible())
+
+def test_incremental_search_matches_a_fresh_one(lib):
+    for text in ('a', 'an', 'ana', 'anal'):
+        lib.filterBlocks(text)
+    incremental = shown(lib)
+    lib.filterBlocks('')
+    lib.filterBlocks('anal')
+    assert incremental == shown(lib) == matching(lib, 'anal')
+
+def test_shorter_text_searches_everything_again(lib):
+    lib.filterBlocks('digitalw')
+    assert shown(lib) == set(['digitalWrite'])
+    lib.filterBlocks('digital')
+    assert shown(lib) == set(['digitalWrite', 'digitalRead'])
+
+def test_no_match_hides_every_section(lib):
+    lib.filterBlocks('no such block')
+    assert not any(s.isVisible() for s in lib._sections)
+
+def test_empty_text_restores_the_sections(lib):
+    lib._sections[1].expand()
+    before = [s.isCollapsed() for s in lib._sections]
+    lib.filterBlocks('millis')
+    lib.filterBlocks('')
+    assert [s.isCollapsed() for s in lib._sections] == before
+    assert all(s.isVisible() for s in lib._sections)
+    assert shown(lib) == set(b.definition['name']
+                             for b in lib._sections[1].blocks)
+    lib._sections[1].collapse()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Tests of the settings loading of visuino.settings.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Tests of the validation of theme files and of the settings cache.
+"""
+import json, os
+
+import pytest
+
+pytest.importorskip('PyQt4')
+
+from visuino import settings
+from visuino.settings import merge_settings, load_settings, VGS
+
+BASE = {'notch': {'io_shape': 'arc', 'io_basis': 0.0, 'vf_x0': 20,
+                  'io_size': {'width': 10, 'height': 20}},
+        'debug': False}
+
+@pytest.fixture
+def defaults():
+    ''' () -> NoneType
+
+    Loads the default settings back after the test.
+    '''
+    yield
+    load_settings(cache_file=None)
+
+def test_merge_overrides_nested_values():
+    merged = merge_settings(BASE, {'notch': {'io_size': {'width': 12}}})
+    assert merged['notch']['io_size'] == {'width': 12, 'height': 20}
+    assert merged['notch']['io_shape'] == 'arc'
+    assert BASE['notch']['io_size']['width'] == 10
+
+def test_merge_accepts_int_for_float():
+    assert merge_settings(BASE, {'notch': {'io_basis': 1}}) \
+               ['notch']['io_basis'] == 1
+
+def test_merge_rejects_unknown_keys():
+    with pytest.raises(ValueError) as info:
+        merge_settings(BASE, {'notch': {'io_colour': 'red'}}, 'theme.yaml')
+    assert 'notch.io_colour' in str(info.value)
+    assert 'theme.yaml' in str(info.value)
+
+@pytest.mark.parametrize('override', [
+    {'notch': {'vf_x0': '20'}},         # string for a number
+    {'notch': {'vf_x0': True}},         # bool for a number
+    {'debug': 1},                       # number for a bool
+    {'notch': {'io_shape': 3}},         # number for a string
+    {'notch': {'vf_x0': {'x': 1}}},     # section for a value
+    {'notch': 'arc'},                   # value for a section
+])
+def test_merge_rejects_values_of_another_kind(override):
+    with pytest.raises(ValueError):
+        merge_settings(BASE, override)
+
+def test_theme_file_is_merged_and_cached(tmpdir, defaults):
+    theme = tmpdir.join('theme.yaml')
+    theme.write('styles:\n    notch:\n        vf_x0: 33\n')
+    cache = str(tmpdir.join('settings.cache'))
+
+    result = load_settings([str(theme)], cache_file=cache)
+    assert result is VGS
+    assert VGS['styles']['notch']['vf_x0'] == 33
+
+    with open(cache) as stream:
+        cached = json.load(stream)
+    assert cached['settings']['styles']['notch']['vf_x0'] == 33
+    # no temporary file is left behind
+    assert sorted(x.basename for x in tmpdir.listdir()) == \
+           ['settings.cache', 'theme.yaml']
+
+    # a changed theme file invalidates the cache
+    theme.write('styles:\n    notch:\n        vf_x0: 34\n')
+    load_settings([str(theme)], cache_file=cache)
+    assert VGS['styles']['notch']['vf_x0'] == 34
+
+def test_corrupted_cache_is_ignored(tmpdir, defaults):
+    cache = tmpdir.join('settings.cache')
+    cache.write('not json')
+    load_settings(cache_file=str(cache))
+    assert VGS['styles']['notch']['io_shape'] == 'arc'
+
+def test_cache_is_written_only_when_asked(tmpdir, defaults):
+    cache = str(tmpdir.join('settings.cache'))
+    load_settings(cache_file=cache, write_cache=False)
+    assert not os.path.exists(cache)
+    settings.save_settings_cache()
+    assert os.path.exists(cache)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Tests of the style store of visuino.settings.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Tests of the section versions and change notifications of StyleStore.
+"""
+import pytest
+
+pytest.importorskip('PyQt4')
+
+from visuino.settings import StyleStore, load_settings
+
+@pytest.fixture
+def store():
+    ''' () -> StyleStore
+
+    A new store over VGS, whose default settings are loaded back after the
+    test (the store changes VGS in place).
+    '''
+    yield StyleStore()
+    load_settings(cache_file=None)
+
+def test_get_dotted_key(store):
+    assert store.get('notch', 'io_size.width') == 10
+
+def test_set_bumps_only_the_changed_section(store):
+    before = store.getVersion('notch', 'block_function_call')
+    store.set('notch', 'io_size.width', 12)
+    after = store.getVersion('notch', 'block_function_call')
+    assert store.get('notch', 'io_size.width') == 12
+    assert after[0] > before[0]
+    assert after[1] == before[1]
+    assert store.getVersion() == after[0]
+
+def test_setting_the_current_value_does_nothing(store):
+    version = store.getVersion()
+    store.set('notch', 'vf_x0', store.get('notch', 'vf_x0'))
+    assert store.getVersion() == version
+
+def test_subscribers_of_the_section_are_notified(store):
+    calls, others = [], []
+    store.subscribe('notch', lambda *args: calls.append(args))
+    store.subscribe('block_arg_label', lambda *args: others.append(args))
+    store.set('notch', 'vf_x0', 25)
+    assert calls == [('notch', 'vf_x0')]
+    assert others == []
+
+def test_changed_without_section_notifies_all(store):
+    calls = []
+    callback = lambda *args: calls.append(args)
+    store.subscribe(['notch', 'block_function_call'], callback)
+    versions = store.getVersion('notch', 'block_start_end')
+    store.changed()
+    assert sorted(calls) == [('block_function_call', None), ('notch', None)]
+    assert all(new > old for new, old in
+               zip(store.getVersion('notch', 'block_start_end'), versions))
+
+def test_unsubscribe(store):
+    calls = []
+    callback = lambda *args: calls.append(args)
+    store.subscribe('notch', callback)
+    store.unsubscribe('notch', callback)
+    store.set('notch', 'vf_x0', 30)
+    assert calls == []
+
+def test_compiled_style_is_rebuilt_only_after_changes(store, qapp):
+    style = store.getStyle('notch')
+    assert store.getStyle('notch') is style
+    store.set('notch', 'vf_x0', 35)
+    assert store.getStyle('notch') is not style
+    assert store.getStyle('notch')['vf_x0'] == 35
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Tests of visuino.gx.text_metrics.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Tests of the LRU cache of fonts and text sizes.
+"""
+import pytest
+
+pytest.importorskip('PyQt4')
+
+from visuino.settings import STYLES
+from visuino.gx.text_metrics import TextMetricsCache
+
+FONT = ('Verdana', 10, -1)
+
+def measure(cache, text):
+    return cache.getTextSize(*FONT + (text,))
+
+def test_repeated_lookups_are_hits(qapp):
+    cache = TextMetricsCache()
+    first = measure(cache, 'digitalWrite')
+    assert measure(cache, 'digitalWrite') == first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.getHitRate() == 0.5
+
+def test_least_recently_used_text_is_dropped(qapp):
+    cache = TextMetricsCache(max_size=2)
+    measure(cache, 'a')
+    measure(cache, 'b')
+    measure(cache, 'a')         # 'b' is now the least recently used
+    measure(cache, 'c')         # drops 'b'
+    assert cache.getStats()['texts'] == 2
+
+    misses = cache.misses
+    measure(cache, 'a')
+    assert cache.misses == misses
+    measure(cache, 'b')
+    assert cache.misses == misses + 1
+
+def test_least_recently_used_font_is_dropped(qapp):
+    cache = TextMetricsCache(max_fonts=2)
+    font = cache.getFont('Verdana', 10)
+    cache.getFont('Verdana', 11)
+    assert cache.getFont('Verdana', 10) is font
+    cache.getFont('Verdana', 12)        # drops size 11
+    assert cache.getStats()['fonts'] == 2
+    assert cache.getFont('Verdana', 10) is font
+
+def test_style_change_clears_the_cache(qapp):
+    cache = TextMetricsCache()
+    measure(cache, 'loop')
+    STYLES.changed('block_function_call')
+    measure(cache, 'loop')
+    assert (cache.hits, cache.misses) == (0, 1)
+
+def test_font_text_size_accepts_any_font(qapp):
+    from PyQt4.QtGui import QFont
+    cache = TextMetricsCache()
+    font = QFont('Verdana')
+    font.setPixelSize(14)       # pointSize() is -1 for this font
+    w, h = cache.getFontTextSize(font, u'canção')
+    assert w > 0 and h > 0
+    assert cache.getFontTextSize(QFont(font), u'canção') == (w, h)
+    assert cache.hits == 1
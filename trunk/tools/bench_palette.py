@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Benchmark of the pixels repainted by the palette on each kind
+#              of interaction, for every viewport update mode.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Opens a ``GxViewPalette`` window and replays a fixed set of interactions
+(expanding and collapsing a section, hovering, cloning a block and dropping
+it back, scrolling the palette) with ``QTest``, once for each viewport update
+mode of the palette view. The paint events received by the palette viewport
+and by the blocks viewport are summed up, and a table of the repainted
+pixels per interaction is printed::
+
+    python tools/bench_palette.py
+
+Needs a display (a virtual one, as ``xvfb-run``, is fine).
+"""
+from __future__ import division, print_function
+import sys, os
+# the visuino package is on the parent folder of this script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir))
+
+from PyQt4.QtGui import *
+from PyQt4.QtCore import *
+from PyQt4.QtTest import QTest
+
+from visuino.gx.palette import GxViewPalette
+
+#: Time (ms) given to Qt for processing the updates of each interaction
+SETTLE_TIME = 100
+
+UPDATE_MODES = [('full', QGraphicsView.FullViewportUpdate),
+                ('bounding rect', QGraphicsView.BoundingRectViewportUpdate),
+                ('minimal', QGraphicsView.MinimalViewportUpdate),
+                ('smart', QGraphicsView.SmartViewportUpdate)]
+
+
+class PaintCounter(QObject):
+    '''
+    Event filter that sums the area of the paint events of a widget.
+    '''
+    def __init__(self, widget):
+        QObject.__init__(self, widget)
+        self.pixels, self.events = 0, 0
+        widget.installEventFilter(self)
+
+    def reset(self):
+        self.pixels, self.events = 0, 0
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.events += 1
+            self.pixels += sum(r.width() * r.height()
+                               for r in event.region().rects())
+        return False
+
+
+def _palette_point(view, scene_pos):
+    ''' (GxViewPalette, QPointF) -> QPoint
+
+    Maps a point of the palette scene onto the blocks viewport.
+    '''
+    palette = view.palette_blocks
+    inner_view = palette.widget()
+    inner_pos = inner_view.viewport().mapTo(inner_view,
+                                            inner_view.mapFromScene(scene_pos))
+    return view.mapFromScene(palette.mapToScene(QPointF(inner_pos)))
+
+def _interactions(view):
+    ''' (GxViewPalette) -> list of (str, function)
+    '''
+    viewport = view.viewport()
+    sections = view.palette_blocks.widget()._sections
+    header = lambda: _palette_point(view, sections[0].pos() + QPointF(20, 10))
+    icon = lambda: _palette_point(view, sections[0]._blocks[0].pos() +
+                                        QPointF(10, 10))
+    empty = lambda: _palette_point(view, QPointF(5, 1900))
+
+    def clone_and_drop():
+        QTest.mousePress(viewport, Qt.LeftButton, Qt.NoModifier, icon())
+        QTest.mouseMove(viewport, icon() + QPoint(5, 5))
+        QTest.mouseRelease(viewport, Qt.LeftButton, Qt.NoModifier,
+                           icon() + QPoint(5, 5))
+
+    def scroll():
+        bar = view.palette_blocks.widget().verticalScrollBar()
+        bar.setValue(bar.value() + 40)
+
+    return [('expand section',
+             lambda: QTest.mouseClick(viewport, Qt.LeftButton,
+                                      Qt.NoModifier, header())),
+            ('hover icon', lambda: QTest.mouseMove(viewport, icon())),
+            ('hover empty area', lambda: QTest.mouseMove(viewport, empty())),
+            ('clone and drop', clone_and_drop),
+            ('scroll palette', scroll),
+            ('collapse section',
+             lambda: QTest.mouseClick(viewport, Qt.LeftButton,
+                                      Qt.NoModifier, header()))]
+
+def run(mode):
+    ''' (QGraphicsView.ViewportUpdateMode) -> list of (str, int, int, int)
+
+    Replays the interactions on a new palette window using 'mode' on the
+    palette view. Returns, for each interaction, its name and the pixels
+    repainted on the palette viewport and on the blocks viewport, plus the
+    number of paint events.
+    '''
+    win = QMainWindow()
+    win.setGeometry(100, 100, 900, 600)
+    view = GxViewPalette(parent=win, opengl=False)
+    win.setCentralWidget(view)
+    palette_view = view.palette_blocks.widget()
+    palette_view.setViewportUpdateMode(mode)
+    win.show()
+    QTest.qWaitForWindowShown(win)
+    QTest.qWait(SETTLE_TIME)
+
+    inner = PaintCounter(palette_view.viewport())
+    outer = PaintCounter(view.viewport())
+
+    results = []
+    for name, action in _interactions(view):
+        QTest.qWait(SETTLE_TIME)
+        inner.reset()
+        outer.reset()
+        action()
+        QTest.qWait(SETTLE_TIME)
+        results.append((name, inner.pixels, outer.pixels,
+                        inner.events + outer.events))
+    win.close()
+    win.deleteLater()
+    return results
+
+def main():
+    app = QApplication(sys.argv)
+
+    print('%-14s %-18s %12s %12s %7s' % ('mode', 'interaction',
+          'palette px', 'blocks px', 'events'))
+    for mode_name, mode in UPDATE_MODES:
+        for name, inner_px, outer_px, events in run(mode):
+            print('%-14s %-18s %12d %12d %7d' % (mode_name, name, inner_px,
+                                                 outer_px, events))
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Headless (offscreen) rendering of sketch files into PNG or SVG
+#              images, for many files at once using a pool of processes.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Usage (from the folder containing the ``visuino`` package)::
+
+    python -m visuino.core.batch_render -o thumbs -f png -s 320x240 *.vsn
+
+Each worker process creates its own ``QApplication`` (on the ``offscreen``
+platform, unless ``QT_QPA_PLATFORM`` says otherwise) and parses the library
+definitions just once, then renders every sketch it receives on a fresh
+``GxSceneBlocks``. The parent process never creates any Qt object.
+
+Note: Qt 4 builds for X11 have no ``offscreen`` platform plugin, so there
+the workers still need a display - a virtual one (e.g. ``xvfb-run``) does.
+"""
+from __future__ import division, print_function
+import sys, os
+if __name__ == '__main__':
+    sys.path.append('../../')
+
+import argparse
+import multiprocessing
+from timeit import default_timer
+
+__all__ = ['render_sketch', 'render_batch', 'fit_size']
+
+#: Default limits (pixels) for the width and height of the output images
+DEFAULT_MAX_SIZE = (1024, 1024)
+
+#: Hard limit on the number of pixels of a single output image
+MAX_PIXELS = 4096 * 4096
+
+#: Free space (scene units) kept around the blocks on the output images
+MARGIN = 10
+
+#: Number of sketches rendered by a worker before it gets replaced by a new
+#: process (keeps memory bounded on very long batches)
+TASKS_PER_WORKER = 200
+
+FORMATS = ('png', 'svg')
+
+# per process state: QApplication and LibraryDefinitions of the worker
+_worker = {}
+
+def _init_worker():
+    ''' () -> NoneType
+
+    Prepares the Qt application of the current process. Must run before
+    any block is created. Called by render_sketch() itself, so a failure
+    here is reported on the sketch being rendered, instead of killing the
+    worker (which the pool would then respawn forever).
+    '''
+    if 'libs' in _worker:
+        return
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from PyQt4.QtGui import QApplication
+    from visuino.core.lib_defs import LibraryDefinitions
+
+    _worker.clear()
+    _worker['app'] = QApplication.instance() or QApplication(['visuino'])
+    _worker['libs'] = LibraryDefinitions()
+
+def fit_size(width, height, max_size=DEFAULT_MAX_SIZE, scale=1.0):
+    ''' (number, number, tuple of 2 int, float) -> tuple of 2 int
+
+    Size (in pixels) of the image for a scene region of 'width' x 'height',
+    zoomed by 'scale' but shrunk (keeping the aspect ratio) to respect both
+    'max_size' and MAX_PIXELS.
+    '''
+    k = scale
+    if max_size:
+        k = min(k, max_size[0] / width, max_size[1] / height)
+    if width * height * k * k > MAX_PIXELS:
+        k = (MAX_PIXELS / (width * height)) ** 0.5
+    return max(1, int(width * k)), max(1, int(height * k))
+
+def render_sketch(filename, output, fmt=None, max_size=DEFAULT_MAX_SIZE,
+                  scale=1.0, background=None):
+    ''' (str, str, str, tuple of 2 int, float, str) -> dict
+
+    Loads the sketch 'filename' (.vsn) onto an offscreen scene and saves its
+    image on 'output', as 'png' or 'svg' ('fmt' defaults to the extension
+    of 'output'). The 'background' is a color name; None means transparent
+    (PNG only).
+
+    Errors (including an unreadable or malformed sketch) never propagate:
+    they go on the 'error' of the report.
+
+    Returns a report of the rendering, with the keys: 'input', 'output',
+    'ok' (bool), 'error' (str or None), 'size' (width, height), 'load_ms'
+    and 'render_ms'.
+    '''
+    import sip
+    from PyQt4.QtGui import QColor, QBrush, QGraphicsItem
+    from PyQt4.QtCore import Qt, QSize
+
+    fmt = (fmt or os.path.splitext(output)[1][1:]).lower()
+    report = {'input': filename, 'output': output, 'ok': False,
+              'error': None, 'size': (0, 0), 'load_ms': 0.0,
+              'render_ms': 0.0}
+    scene = None
+    try:
+        _init_worker()
+        from visuino.gx.bases import GxSceneBlocks
+        from visuino.gx.utils import scene_to_image, scene_to_svg
+        from visuino.core.sketch import SketchBlocks
+
+        if fmt not in FORMATS:
+            raise ValueError("unknown output format '%s'" % fmt)
+
+        t0 = default_timer()
+        scene = GxSceneBlocks(background_grid=False)
+        scene.auto_grow = False
+        scene.setBackgroundBrush(QBrush(QColor(background)) if background
+                                 else QBrush(Qt.NoBrush))
+        sketch = SketchBlocks(_worker['libs'])
+        sketch.loadSketch(filename)
+        sketch.drawSnippets(scene, None)
+
+        # cached items would be drawn as bitmaps (on SVG) and the cache
+        # is useless for a single render anyway
+        for item in scene.items():
+            item.setCacheMode(QGraphicsItem.NoCache)
+
+        t1 = default_timer()
+        source = scene.itemsBoundingRect().adjusted(-MARGIN, -MARGIN,
+                                                    MARGIN, MARGIN)
+        w, h = fit_size(source.width(), source.height(), max_size, scale)
+        report['size'] = (w, h)
+
+        if fmt == 'svg':
+            scene_to_svg(scene, output, source, QSize(w, h))
+        else:
+            image = scene_to_image(scene, source, QSize(w, h),
+                                   QColor(background) if background else None)
+            if not image.save(output, 'PNG'):
+                raise IOError("could not write '%s'" % output)
+
+        report['load_ms'] = (t1 - t0) * 1000
+        report['render_ms'] = (default_timer() - t1) * 1000
+        report['ok'] = True
+
+    except Exception as e:
+        report['error'] = '%s: %s' % (type(e).__name__, e)
+
+    finally:
+        # deleteLater() would wait for an event loop the workers never
+        # run, so the scene (and its items) is destroyed right away
+        if scene is not None:
+            scene.clear()
+            sip.delete(scene)
+            scene = None
+    return report
+
+def _render_task(args):
+    ''' (tuple) -> dict
+    '''
+    return render_sketch(*args)
+
+def render_batch(filenames, out_dir, fmt='png', max_size=DEFAULT_MAX_SIZE,
+                 scale=1.0, background=None, processes=None):
+    ''' (list of str, str, str, tuple of 2 int, float, str, int) -> iterator
+
+    Renders all the sketch files onto 'out_dir' (as <name>.<fmt>), spread
+    over a pool of 'processes' workers (default: number of CPUs). Yields
+    the report of each file (see render_sketch()) as soon as it is done,
+    so not on the same order of 'filenames'.
+    '''
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    tasks = [(f, os.path.join(out_dir, os.path.splitext(
+                                os.path.basename(f))[0] + '.' + fmt),
+              fmt, max_size, scale, background) for f in filenames]
+
+    pool = multiprocessing.Pool(processes, maxtasksperchild=TASKS_PER_WORKER)
+    try:
+        for report in pool.imap_unordered(_render_task, tasks):
+            yield report
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def _parse_size(text):
+    ''' (str) -> tuple of 2 int
+    '''
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+
+def main(argv=None):
+    ''' (list of str) -> int
+
+    Command line interface. Prints the timing of each file and a summary,
+    and returns the number of files that failed.
+    '''
+    parser = argparse.ArgumentParser(
+        description='Render Visuino sketches (.vsn) into PNG/SVG images.')
+    parser.add_argument('files', nargs='+', help='sketch files')
+    parser.add_argument('-o', '--out-dir', default='.',
+                        help='output folder (default: current one)')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='png')
+    parser.add_argument('-s', '--max-size', type=_parse_size,
+                        default=DEFAULT_MAX_SIZE, metavar='WxH',
+                        help='maximum image size (default: %dx%d)'
+                             % DEFAULT_MAX_SIZE)
+    parser.add_argument('-z', '--scale', type=float, default=1.0,
+                        help='zoom applied before the size limit')
+    parser.add_argument('-b', '--background', default=None,
+                        help='background color (default: transparent)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes (default: CPUs)')
+    args = parser.parse_args(argv)
+
+    t0, failed, total = default_timer(), 0, 0
+    for r in render_batch(args.files, args.out_dir, args.format,
+                          args.max_size, args.scale, args.background,
+                          args.processes):
+        total += 1
+        if r['ok']:
+            print('ok    %8.1f ms load %8.1f ms render  %5dx%-5d  %s' %
+                  (r['load_ms'], r['render_ms'], r['size'][0], r['size'][1],
+                   r['input']))
+        else:
+            failed += 1
+            print('FAIL  %s: %s' % (r['input'], r['error']))
+
+    print('%d sketches (%d failed) in %.2f s' % (total, failed,
+                                                 default_timer() - t0))
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
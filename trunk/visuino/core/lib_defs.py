@@ -16,7 +16,7 @@ from collections import OrderedDict
  
 import yaml
 
-__all__ = ['LibraryDefinitions']
+__all__ = ['LibraryDefinitions', 'types_compatible']
     
 DEFAULT_YAML_LIBS = \
 """
@@ -88,6 +88,34 @@ Arduino.h:
                 restriction: null
 """
 
+#: Return types accepted by each argument type, besides the type itself.
+#: Follows the implicit conversions of the Arduino C/C++ subset.
+TYPE_CONVERSIONS = {
+    'int':     ('boolean', 'char', 'byte', 'long'),
+    'long':    ('int', 'boolean', 'char', 'byte'),
+    'float':   ('int', 'long', 'byte'),
+    'boolean': ('int', 'long', 'byte'),
+    'char':    ('int', 'byte'),
+    'byte':    ('int', 'char', 'boolean'),
+    'const':   ('int',),
+}
+
+#: Values of 'return_type'/'type' meaning that there is no type information
+NO_TYPE = (None, '', 'None', 'void')
+
+def types_compatible(arg_type, return_type):
+    ''' (str, str) -> bool
+
+    Tells if a function whose return type is 'return_type' can be plugged
+    on an argument of type 'arg_type' (both as found on the library
+    definitions). Missing type information is always compatible.
+    '''
+    if arg_type in NO_TYPE or return_type in NO_TYPE:
+        return True
+    return arg_type == return_type or \
+           return_type in TYPE_CONVERSIONS.get(arg_type, ())
+
+
 class LibraryDefinitions(dict):
     def __init__(self):
         dict.__init__(self)
@@ -95,7 +123,8 @@ class LibraryDefinitions(dict):
 
     def parseYAML(self):
         
-        self._root = yaml.load(DEFAULT_YAML_LIBS)
+        self._root = yaml.load(DEFAULT_YAML_LIBS, Loader=getattr(
+            yaml, 'CSafeLoader', yaml.SafeLoader))
         
         for lib_name, lib_dict in self._root.items():            
             functions, sections = {}, OrderedDict()
@@ -58,7 +58,7 @@ the board is on. Even on the simplistic blink example above we already
 """
 
 from __future__ import division, print_function
-import sys
+import sys, copy
 if __name__ == '__main__':
     sys.path.append('../../')
 
@@ -69,6 +69,7 @@ from PyQt4.QtGui import *
 from PyQt4.QtCore import *
 
 from visuino.gx.blocks import *
+from visuino.utils import trace_register
 
 __all__ = ['SketchBlocks']
 
@@ -215,20 +216,30 @@ class SketchBlocks(object):
     def loadSketch(self, filename):
         '''
         :param filename: ``str``.
-            Load a sketch from some filename
+            Load a sketch from some filename. Only plain YAML data is
+            accepted (no Python object tags); syntax errors raise
+            ``yaml.YAMLError`` and a file that is not a sketch raises
+            ``ValueError``.
         '''
         stream = open(filename, 'r')
-        self._root = yaml.load(stream)
+        try:
+            root = yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader',
+                                                    yaml.SafeLoader))
+        finally:
+            stream.close()
+        if not isinstance(root, dict) or \
+           not isinstance(root.get('snippets'), dict):
+            raise ValueError("'%s' is not a sketch file" % filename)
+        self._root = root
 #        print('#'*40)
 #        print('The following content was loaded:')
 #        print('-'*40)
 #        pprint(yaml.dump(self._root), indent=4)
 #        print('#'*40)        
-        stream.close()
         
     def dumpSketch(self, filename):
         stream = open(filename, 'w')
-        yaml.dump(self._root, stream, indent=4)
+        yaml.safe_dump(self._root, stream, indent=4)
 #        print('#'*40)
 #        print('The following content was saved:')
 #        print('-'*40)
@@ -251,18 +262,31 @@ class SketchBlocks(object):
         return new_id 
         
     def drawSnippets(self, scene, palette):
-        for snippet_id in self._root['snippets'].keys():
-#            print('Drawing snippet %d...' % snippet_id)
-            self.drawSnippet(snippet_id, scene, palette)
+        ''' (QGraphicsScene, GxPalette)
+        '''
+        # no need for indexing each new block while adding them all
+        bulk = hasattr(scene, 'beginBulkLoad')
+        if bulk:
+            scene.beginBulkLoad()
+        try:
+            for snippet_id in self._root['snippets'].keys():
+#                print('Drawing snippet %d...' % snippet_id)
+                self.drawSnippet(snippet_id, scene, palette)
+        finally:
+            if bulk:
+                scene.endBulkLoad()
             
     def drawSnippet(self, snippet_id, scene, palette=None):
-        ''' (int, QGraphicsScene, GxPalette)
+        ''' (int, QGraphicsScene, GxPalette) -> GxPluggableBlock
+
+        Returns the first block of the snippet (None if there is no snippet
+        with that id).
         '''
         if not snippet_id in self._root['snippets']: 
             return
         snippet = self._root['snippets'][snippet_id]
                 
-        parent_vf = None
+        parent_vf = first_block = None
         
         for element in snippet['body']:
             
@@ -272,10 +296,30 @@ class SketchBlocks(object):
                 new_block.setPos(snippet['pos'][0], snippet['pos'][1])
                 new_block.sketch = self
                 new_block.snippet_id = snippet_id
+                first_block = new_block
             else:
                 new_block.plugVfFemale(parent_vf, update_snippet=False)
             
             parent_vf = new_block
+        return first_block
+
+    def drawNewSnippet(self, body, pos, scene, palette=None):
+        ''' (list of dict, QPointF, QGraphicsScene, GxPalette) 
+                -> GxPluggableBlock
+
+        Adds a new snippet made of copies of the given elements (e.g. the
+        ones of existing blocks, for duplicating them), draws it at 'pos'
+        and returns its first block.
+        '''
+        new_id = self._snippet_id_count
+        self._snippet_id_count += 1
+        self._root['snippets'][new_id] = {'pos': [pos.x(), pos.y()],
+                                          'body': copy.deepcopy(body)}
+        first_block = self.drawSnippet(new_id, scene, palette)
+        first_block.updateMySnippet()
+        if hasattr(scene, 'scheduleSceneRectUpdate'):
+            scene.scheduleSceneRectUpdate()
+        return first_block
 
     def updateSnippet(self, first_block):
         ''' (GxPluggableBlock)
@@ -364,12 +408,18 @@ class SketchBlocks(object):
             return new_block            
         
     def _setBlockProperties(self, block, palette):
-        block.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+        if block.scene().cache_policy:
+            block.scene().cache_policy.apply(block)
+        else:
+            block.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
         block.setFlags(QGraphicsItem.ItemIsMovable | QGraphicsItem.ItemIsSelectable)
         block.palette_blocks = palette
         block.setCursor(Qt.OpenHandCursor)        
-        
-        
+
+trace_register(SketchBlocks, ('loadSketch', 'dumpSketch', 'updateSnippet',
+                              'drawSnippets'), 'core')
+
+
 if __name__ == '__main__':
     sketch = SketchBlocks(None)
     pprint(sketch._root)
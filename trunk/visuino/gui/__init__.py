@@ -1,2 +1,3 @@
 from .main_window import *
 #del main_window
+from .minimap import *
@@ -20,6 +20,9 @@ from PyQt4.QtCore import *
 
 from visuino.gx.palette import *
 from visuino.gx.blocks import *
+from visuino.gui.minimap import MinimapWidget
+from visuino.utils import trace_start, trace_stop, trace_save
+from visuino.settings import save_settings_cache
 from visuino.resources import *
 
 __all__ = ['MainWindow', 'AppVisuino']
@@ -29,6 +32,8 @@ class MainWindow(QMainWindow):
     Attributes:
         _app: QApplication. The application that lauched this window.
         _opengl: bool. Says if use Open GL rendering or not.
+        _show_hud: bool. Says if the frame statistics HUD is shown over
+            the blocks view (INI key 'debug/hud').
     '''
 
     def __init__(self, app, opengl=None):
@@ -42,6 +47,7 @@ class MainWindow(QMainWindow):
         QMainWindow.__init__(self, None)
         self._app = app
         self._opengl = opengl
+        self._show_hud = False
 
         self.setupIniSettings()
 
@@ -81,6 +87,8 @@ class MainWindow(QMainWindow):
             if self._opengl is None:
                 self._opengl = value_opengl
 
+            self._show_hud = self._readIniBool('debug/hud')
+
             print("The following configuration file was loaded:\n%s\n\n" \
                   % ini_filename)
         else:
@@ -89,6 +97,21 @@ class MainWindow(QMainWindow):
             print(ini_filename)
 
 
+    def _readIniBool(self, key, default=False):
+        ''' (str, bool) -> bool
+
+        Reads a boolean value from the INI file, or 'default' if missing.
+        '''
+        value = self._ini_file.value(key)
+        try:
+            # for python 2.7
+            return value.toBool() if value.isValid() else default
+        except AttributeError:
+            # for python 3.3
+            if value is None:
+                return default
+            return str(value).lower()[:1] == 't'
+
     def createDefaultIni(self):
         ''' (QSettings) -> NoneType
 
@@ -97,6 +120,7 @@ class MainWindow(QMainWindow):
         ini = self._ini_file
         ini.setValue('engine/opengl', self._opengl
                      if self._opengl is not None else False)
+        ini.setValue('debug/hud', self._show_hud)
 
 
     def updateIniSettings(self):
@@ -106,6 +130,7 @@ class MainWindow(QMainWindow):
         '''
         ini = self._ini_file
         ini.setValue('engine/opengl', self._opengl)
+        ini.setValue('debug/hud', self._show_hud)
 
 
     def closeEvent(self, event):
@@ -128,6 +153,7 @@ class MainWindow(QMainWindow):
 
         self.wg_blocks_view = GxViewPalette(parent=self,
                                             opengl=self._opengl)
+        self.wg_blocks_view.setHudVisible(self._show_hud)
 
         # --- Code Area --------------------------------------------------
 
@@ -139,6 +165,14 @@ class MainWindow(QMainWindow):
         self.wg_main_tab.addTab(self.wg_blocks_view, 'Blocks')
         self.wg_main_tab.addTab(self.wg_area_code, 'Code')
 
+        # --- Overview (minimap) -----------------------------------------
+
+        self.wg_minimap = MinimapWidget(self.wg_blocks_view, self)
+        self.wg_dock_minimap = QDockWidget('Overview', self)
+        self.wg_dock_minimap.setObjectName('dock_minimap')
+        self.wg_dock_minimap.setWidget(self.wg_minimap)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.wg_dock_minimap)
+
         # --- Main menu --------------------------------------------------
 
         self.wg_menu_file = QMenu('&File', self)
@@ -154,6 +188,21 @@ class MainWindow(QMainWindow):
                      self.actionSetOptionOpenGl)
         self.wg_menu_options = QMenu('&Options', self)
         self.wg_menu_options.addAction(self.action_open_gl)
+        self.wg_menu_options.addAction(
+            self.wg_dock_minimap.toggleViewAction())
+
+        self.action_hud = QAction('Performance &HUD', self)
+        self.action_hud.setCheckable(True)
+        self.action_hud.setChecked(self._show_hud)
+        self.connect(self.action_hud, SIGNAL('triggered()'),
+                     self.actionSetOptionHud)
+        self.wg_menu_options.addAction(self.action_hud)
+
+        self.action_trace = QAction('Record &trace', self)
+        self.action_trace.setCheckable(True)
+        self.connect(self.action_trace, SIGNAL('triggered()'),
+                     self.actionSetOptionTrace)
+        self.wg_menu_options.addAction(self.action_trace)
 
         menu_bar = QMenuBar(self)
         menu_bar.addMenu(self.wg_menu_file)
@@ -210,6 +259,33 @@ class MainWindow(QMainWindow):
             "this change to take effect!", QMessageBox.Ok).exec_()
             
 
+    def actionSetOptionHud(self):
+        ''' () -> NoneType
+
+        Trigger of the main menu Option > Performance HUD. Shows/hides the
+        frame statistics over the blocks view.
+        '''
+        self._show_hud = self.action_hud.isChecked()
+        self.wg_blocks_view.setHudVisible(self._show_hud)
+
+    def actionSetOptionTrace(self):
+        ''' () -> NoneType
+
+        Trigger of the main menu Option > Record trace. When unchecked, asks
+        where to save the recorded trace (Chrome trace-event JSON).
+        '''
+        if self.action_trace.isChecked():
+            trace_start()
+            return
+
+        if trace_stop() == 0:
+            return
+        filename = QFileDialog.getSaveFileName(self, 'Save trace', '',
+                                               '*.json')
+        if filename:
+            trace_save(str(filename))
+            
+
 class AppVisuino(QApplication):
     '''
     The hole Visuino application is launched by this class. It holds
@@ -251,6 +327,7 @@ class AppVisuino(QApplication):
         main_win = MainWindow(app=self, opengl=opengl)
         main_win.show()
         splash.finish(main_win)
+        save_settings_cache()
         return self.exec_()
 
 if __name__ == '__main__':
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Overview (minimap) of the whole blocks scene, with a draggable
+#              rectangle representing the area shown by the view.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+from __future__ import division, print_function
+import sys
+if __name__ == '__main__':
+    sys.path.append('../../')
+
+from PyQt4.QtGui import *
+from PyQt4.QtCore import *
+
+__all__ = ['MinimapWidget']
+
+class MinimapWidget(QWidget):
+    '''
+    Shows a thumbnail of the whole scene of some ``GxView``, along with the
+    rectangle of the area currently visible on it. Clicking or dragging on
+    the minimap centers the view on that point.
+
+    The thumbnail is kept on an image that is rendered only once. After
+    that, only the scene regions reported by ``QGraphicsScene.changed`` are
+    rendered again (merged together, at most once every
+    ``self.UPDATE_INTERVAL`` miliseconds).
+
+    Attributes:
+        _view: GxView. The view being followed.
+        _image: QImage. Cached thumbnail of the scene.
+        _dirty: QRectF. Scene region waiting to be rendered again.
+    '''
+    #: Minimum interval (ms) between two updates of the thumbnail
+    UPDATE_INTERVAL = 100
+
+    VIEWPORT_COLOR = QColor(0, 85, 212)
+
+    def __init__(self, view, parent=None):
+        ''' (GxView, QWidget) -> NoneType
+        '''
+        QWidget.__init__(self, parent)
+        self._view = view
+        self._image = None
+        self._dirty = QRectF()
+
+        self.setMinimumSize(120, 90)
+        self.setCursor(Qt.PointingHandCursor)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.UPDATE_INTERVAL)
+        self._timer.timeout.connect(self._renderDirty)
+
+        scene = view.scene()
+        scene.changed.connect(self._onSceneChanged)
+        scene.sceneRectChanged.connect(self.invalidate)
+        view.horizontalScrollBar().valueChanged.connect(self.update)
+        view.verticalScrollBar().valueChanged.connect(self.update)
+
+    def sizeHint(self):
+        return QSize(200, 150)
+
+    def _getTransform(self):
+        ''' () -> QTransform
+
+        Transformation from scene coordinates to the thumbnail coordinates,
+        keeping the aspect ratio and centering the scene on the widget.
+        '''
+        rect = self._view.scene().sceneRect()
+        if rect.isEmpty():
+            return QTransform()
+        k = min(self.width() / rect.width(), self.height() / rect.height())
+        dx = (self.width() - k*rect.width())/2 - k*rect.x()
+        dy = (self.height() - k*rect.height())/2 - k*rect.y()
+        return QTransform(k, 0, 0, k, dx, dy)
+
+    def invalidate(self):
+        ''' () -> NoneType
+
+        Throws away the whole thumbnail, which will be rendered again on
+        the next paint.
+        '''
+        self._image = None
+        self._dirty = QRectF()
+        self.update()
+
+    def _renderRegion(self, scene_rect):
+        ''' (QRectF) -> NoneType
+
+        Renders the given scene region onto the thumbnail.
+        '''
+        t = self._getTransform()
+        target = t.mapRect(scene_rect).toAlignedRect()\
+                  .intersected(self._image.rect())
+        if target.isEmpty():
+            return
+        # the source must match the whole pixels of the target
+        source = t.inverted()[0].mapRect(QRectF(target))
+
+        painter = QPainter(self._image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(target, self.palette().window())
+        self._view.scene().render(painter, QRectF(target), source,
+                                  Qt.IgnoreAspectRatio)
+        painter.end()
+
+    def _onSceneChanged(self, regions):
+        ''' (list of QRectF) -> NoneType
+        '''
+        if self._image is None:
+            return
+        for rect in regions:
+            self._dirty = self._dirty.united(rect)
+        if not self._dirty.isEmpty() and not self._timer.isActive():
+            self._timer.start()
+
+    def _renderDirty(self):
+        ''' () -> NoneType
+        '''
+        if self._image is not None and not self._dirty.isEmpty():
+            self._renderRegion(self._dirty)
+            self.update()
+        self._dirty = QRectF()
+
+    def paintEvent(self, event):
+        ''' QWidget.paintEvent(QPaintEvent) -> NoneType
+        '''
+        if self._image is None or self._image.size() != self.size():
+            self._image = QImage(self.size(),
+                                 QImage.Format_ARGB32_Premultiplied)
+            self._image.fill(self.palette().window().color().rgba())
+            self._renderRegion(self._view.scene().sceneRect())
+            self._dirty = QRectF()
+
+        painter = QPainter(self)
+        painter.drawImage(0, 0, self._image)
+
+        viewport_rect = self._view.mapToScene(
+            self._view.viewport().rect()).boundingRect()
+        painter.setPen(QPen(self.VIEWPORT_COLOR, 2))
+        painter.setBrush(QColor(self.VIEWPORT_COLOR.red(),
+                                self.VIEWPORT_COLOR.green(),
+                                self.VIEWPORT_COLOR.blue(), 40))
+        painter.drawRect(self._getTransform().mapRect(viewport_rect))
+        painter.end()
+
+    def _centerViewOn(self, pos):
+        ''' (QPoint) -> NoneType
+        '''
+        self._view.centerOn(self._getTransform().inverted()[0].map(
+            QPointF(pos)))
+
+    def mousePressEvent(self, event):
+        ''' QWidget.mousePressEvent(QMouseEvent) -> NoneType
+        '''
+        if event.button() == Qt.LeftButton:
+            self._centerViewOn(event.pos())
+
+    def mouseMoveEvent(self, event):
+        ''' QWidget.mouseMoveEvent(QMouseEvent) -> NoneType
+        '''
+        if event.buttons() & Qt.LeftButton:
+            self._centerViewOn(event.pos())
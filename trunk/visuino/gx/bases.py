@@ -28,10 +28,13 @@ to the Graphics View Framework or represents subclasses of ``QGraphicsItem``,
 i.e., can be inserted on the scene.
 """
 from __future__ import division, print_function
-import sys
+import sys, math, weakref
 if __name__ == '__main__':
     sys.path.append('../../')
 
+from collections import OrderedDict
+from timeit import default_timer
+
 from PyQt4.QtGui import *
 from PyQt4.QtCore import *
 
@@ -40,6 +43,11 @@ try:
 except:
     QGLWidget = None
 
+from visuino.core.lib_defs import types_compatible, NO_TYPE
+from visuino.settings import VGS
+from visuino.gx.hud import FRAME_STATS, FrameStats, draw_hud
+from visuino.gx.layout import LAYOUT_SCHEDULER
+
 __all__ = ['GxSceneBlocks', 'GxBlock','GxView']
 
 class GxView(QGraphicsView):
@@ -51,7 +59,37 @@ class GxView(QGraphicsView):
         Enable/disable the wheel zooming feature.
     :ivar _zoom_level: ``int`` <0>. 
         Keeps track of how many scalings have occured.
+    :ivar show_hud: ``bool`` <False>.
+        Shows frame statistics over the viewport (see ``self.setHudVisible()``).
+    :ivar frame_stats: ``FrameStats``.
+        Statistics of the frames painted by this view, while the HUD is shown.
+    :ivar _hud_counts: ``dict`` <None>.
+        Values of the ``FRAME_STATS`` counters at the end of the last frame.
+    :ivar smooth_zoom: ``bool`` <True>.
+        While a zoom gesture (wheel or pinch) goes on, just scales a snapshot
+        of the viewport, re-rendering the scene only when the gesture 
+        settles. See ``self.zoomBy()``.
+    :ivar _zoom_snapshot: ``QPixmap`` <None>.
+        Viewport contents when the current zoom gesture started.
+    :ivar _zoom_factor: ``float`` <1.0>.
+        Scale of the snapshot (relative to the current view transform).
     '''
+    #: Area of the viewport covered by the HUD
+    HUD_RECT = QRect(0, 0, 260, 200)
+
+    #: Interval (ms) for refreshing the HUD while it is visible
+    HUD_INTERVAL = 500
+
+    #: Minimum and maximum scale of the view
+    ZOOM_RANGE = (0.1, 8.0)
+
+    #: Duration (ms) of the animation of each wheel zoom step
+    ZOOM_ANIMATION_TIME = 120
+
+    #: Time (ms) without zoom steps after which the gesture is over and
+    #: the scene is rendered again at the new scale
+    ZOOM_SETTLE_DELAY = 150
+
     def __init__(self, scene=None, parent=None, opengl=False,
                  wheel_zoom=False):
         '''        
@@ -69,9 +107,35 @@ class GxView(QGraphicsView):
         self.wheel_zoom = wheel_zoom
         self._zoom_level = 0
 
+        self.show_hud = False
+        self.frame_stats = FrameStats()
+        self._hud_counts = None
+        self._hud_timer = QTimer(self)
+        self._hud_timer.setInterval(self.HUD_INTERVAL)
+        self._hud_timer.timeout.connect(
+            lambda: self.viewport().update(self.HUD_RECT))
+
         if QGLWidget and opengl:
             self.setViewport(QGLWidget())
 
+        self.smooth_zoom = True
+        self._zoom_snapshot = None
+        self._zoom_anchor = QPointF()
+        self._zoom_factor = self._zoom_from = self._zoom_to = 1.0
+        self._pinch_scale = 1.0
+
+        self._zoom_timeline = QTimeLine(self.ZOOM_ANIMATION_TIME, self)
+        self._zoom_timeline.setCurveShape(QTimeLine.EaseOutCurve)
+        self._zoom_timeline.valueChanged.connect(self._onZoomAnimation)
+
+        self._zoom_settle_timer = QTimer(self)
+        self._zoom_settle_timer.setSingleShot(True)
+        self._zoom_settle_timer.setInterval(self.ZOOM_SETTLE_DELAY)
+        self._zoom_settle_timer.timeout.connect(self._endZoomGesture)
+        self._zoom_timeline.finished.connect(self._zoom_settle_timer.start)
+
+        self.viewport().grabGesture(Qt.PinchGesture)
+
 ##        self.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
         self.setRenderHint(QPainter.Antialiasing)
         self.setRenderHint(QPainter.TextAntialiasing)
@@ -89,24 +153,193 @@ class GxView(QGraphicsView):
     def wheelEvent(self, event):
         ''' *QGraphicsView.wheelEvent(QWheelEvent) -> NoneType*
         
-        Provides the wheel zooming functionality by calling 
-        ``QGraphicsView.scale()`` according to the amount of scrolling.
+        Provides the wheel zooming functionality (see ``self.zoomBy()``),
+        anchored under the mouse. Without it, the wheel just scrolls.
         '''
-        QGraphicsView.wheelEvent(self, event)
+        if not self.wheel_zoom:
+            QGraphicsView.wheelEvent(self, event)
+            return
 
-        if self.wheel_zoom:
+        factor = 1.41 ** (event.delta() / 240.0)
+        if factor < 1: self._zoom_level -= 1
+        else: self._zoom_level += 1
 
-            ##TODO: smooth zooming and keyboard shortcut zooming
+        self.zoomBy(factor, QPointF(event.pos()))
+        event.accept()
 
-            factor = 1.41 ** (event.delta() / 240.0)
-            self.scale(factor, factor)
+    def viewportEvent(self, event):
+        ''' *QGraphicsView.viewportEvent(QEvent) -> bool*
 
-            if factor < 1: self._zoom_level -= 1
-            else: self._zoom_level += 1
+        Handles the pinch gesture (when wheel zooming is enabled).
+        '''
+        if event.type() == QEvent.Gesture and self.wheel_zoom:
+            pinch = event.gesture(Qt.PinchGesture)
+            if pinch is not None:
+                if pinch.state() == Qt.GestureStarted:
+                    self._pinch_scale = 1.0
+                factor = pinch.totalScaleFactor() / self._pinch_scale
+                self._pinch_scale = pinch.totalScaleFactor()
+                self.zoomBy(factor, QPointF(self.viewport().mapFromGlobal(
+                    pinch.centerPoint().toPoint())), animated=False)
+                if pinch.state() in (Qt.GestureFinished, Qt.GestureCanceled):
+                    self._zoom_settle_timer.start()
+                event.accept()
+                return True
+        return QGraphicsView.viewportEvent(self, event)
+
+    def zoomBy(self, factor, anchor, animated=True):
+        '''
+        Scales the view by 'factor', keeping the scene point under 'anchor'
+        still. With ``self.smooth_zoom``, successive calls make up a single
+        gesture: the view transform is only changed (and the scene rendered
+        again) once there is no new call for ``self.ZOOM_SETTLE_DELAY`` ms.
+
+        :param factor: ``float``. Relative to the current zoom.
+        :param anchor: ``QPointF``. Viewport coordinates. Ignored if a 
+            gesture is already going on (its first anchor is kept).
+        :param animated: ``bool`` <True>. Animates the change of scale.
+        '''
+        scale = self.transform().m11()
+        if self._zoom_snapshot is None:
+            if not self.smooth_zoom:
+                target = min(max(scale * factor, self.ZOOM_RANGE[0]),
+                             self.ZOOM_RANGE[1])
+                self._scaleAround(target / scale, anchor)
+                return
+            self._beginZoomGesture(anchor)
+
+        target = min(max(scale * self._zoom_to * factor, self.ZOOM_RANGE[0]),
+                     self.ZOOM_RANGE[1])
+        self._zoom_settle_timer.stop()
+        self._zoom_timeline.stop()
+        self._zoom_from, self._zoom_to = self._zoom_factor, target / scale
+        if animated:
+            self._zoom_timeline.start()
+        else:
+            self._onZoomAnimation(1.0)
 
-            print("Zoom level:", self._zoom_level)
+    def _beginZoomGesture(self, anchor):
+        '''
+        Takes the snapshot of the viewport to be scaled during the gesture.
+        '''
+        viewport = self.viewport()
+        snapshot = QPixmap(viewport.size())
+        snapshot.fill(Qt.transparent)
+        painter = QPainter(snapshot)
+        self.render(painter, QRectF(snapshot.rect()), viewport.rect())
+        painter.end()
+
+        self._zoom_snapshot = snapshot
+        self._zoom_anchor = QPointF(anchor)
+        self._zoom_factor = self._zoom_from = self._zoom_to = 1.0
+
+    def _onZoomAnimation(self, value):
+        '''
+        :param value: ``float``. Progress of the animation (0 to 1).
+        '''
+        self._zoom_factor = self._zoom_from + \
+                            (self._zoom_to - self._zoom_from) * value
+        self.viewport().update()
+
+    def _endZoomGesture(self):
+        '''
+        Applies the zoom of the gesture to the view transform and drops the
+        snapshot, so the scene is rendered again at full quality.
+        '''
+        if self._zoom_snapshot is None:
+            return
+        self._zoom_timeline.stop()
+        self._zoom_snapshot = None
+        self._scaleAround(self._zoom_to, self._zoom_anchor)
+        self._zoom_factor = self._zoom_from = self._zoom_to = 1.0
+        self.viewport().update()
+
+    def _scaleAround(self, factor, anchor):
+        '''
+        Scales the view transform by 'factor', keeping the scene point under
+        'anchor' (viewport coordinates) in place.
+        '''
+        anchor = anchor.toPoint()
+        scene_pos = self.mapToScene(anchor)
+        transformation_anchor = self.transformationAnchor()
+        self.setTransformationAnchor(QGraphicsView.NoAnchor)
+        self.scale(factor, factor)
+        self.setTransformationAnchor(transformation_anchor)
+
+        delta = self.mapFromScene(scene_pos) - anchor
+        self.horizontalScrollBar().setValue(
+            self.horizontalScrollBar().value() + delta.x())
+        self.verticalScrollBar().setValue(
+            self.verticalScrollBar().value() + delta.y())
+
+    def _paintZoomSnapshot(self):
+        '''
+        Draws the snapshot of the current zoom gesture, scaled around its
+        anchor, over the scene background color.
+        '''
+        painter = QPainter(self.viewport())
+        painter.fillRect(self.viewport().rect(), self.backgroundBrush()
+            if self.backgroundBrush().style() != Qt.NoBrush
+            else self.scene().backgroundBrush())
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.translate(self._zoom_anchor)
+        painter.scale(self._zoom_factor, self._zoom_factor)
+        painter.translate(-self._zoom_anchor)
+        painter.drawPixmap(0, 0, self._zoom_snapshot)
+        painter.end()
+
+    def setHudVisible(self, visible):
+        '''
+        Shows/hides the HUD with the frame statistics (FPS, paint time,
+        items painted, collision tests and ``updateMetrics()`` calls per
+        frame, plus a histogram of the last frame times). 
+        See ``visuino.gx.hud``.
+        
+        :param visible: ``bool``.
+        '''
+        self.show_hud = bool(visible)
+        if self.show_hud:
+            self._hud_counts = FRAME_STATS.getCounts()
+            self._hud_timer.start()
+        else:
+            self._hud_timer.stop()
+        self.viewport().update(self.HUD_RECT)
+
+    def paintEvent(self, event):
+        ''' *QGraphicsView.paintEvent(QPaintEvent) -> NoneType*
+
+        When the HUD is visible, measures the frame paint time and draws the
+        statistics over the scene. Repaints of the HUD area alone (caused by
+        its refreshing) are not counted as frames.
 
-            #self.centerOn(event.x(), event.y())
+        Only the blocks painted inside this call are counted for the frame,
+        so the paints of the other views (e.g. the palette) are left out.
+        The other counters take the work done since the last frame.
+
+        During a smooth zoom gesture, only the scaled snapshot is drawn.
+        '''
+        if self._zoom_snapshot is not None:
+            self._paintZoomSnapshot()
+            return
+
+        if not self.show_hud:
+            QGraphicsView.paintEvent(self, event)
+            return
+
+        t0 = default_timer()
+        painted = FRAME_STATS.items_painted
+        QGraphicsView.paintEvent(self, event)
+        if not self.HUD_RECT.contains(event.rect()):
+            counts = FRAME_STATS.getCounts()
+            frame = dict((name, counts[name] - self._hud_counts[name])
+                         for name in counts)
+            frame['items_painted'] = counts['items_painted'] - painted
+            self._hud_counts = counts
+            self.frame_stats.endFrame((default_timer() - t0) * 1000, frame)
+
+        painter = QPainter(self.viewport())
+        draw_hud(painter, self.frame_stats)
+        painter.end()
 
 ##    def drawBackground(self, painter, rect):
 ##        ''' QGraphicsScene.drawBrackground(QPainter, QRectF) -> NoneType
@@ -143,17 +376,93 @@ class GxSceneBlocks(QGraphicsScene):
         
     :ivar io_female_colli_paths: ``set`` of ``visuino.gx.connections.GxColliPath``.
         Hold paths for detecting collision of moving male -> female IO notches.        
+
+    :ivar io_female_slots: ``dict`` of ``set``.
+        The free (nothing plugged) female IO colli paths, grouped by the
+        argument type they accept (as declared on the library definitions).
+        See ``self.getFreeIoSlots()``.
+
+    :ivar auto_grow: ``bool`` <True>.
+        Makes the scene rect grow to contain all the items, whenever they
+        get out of it. Checked after the operations that move or add items
+        (see ``self.scheduleSceneRectUpdate()``), not on every scene change.
+
+    :ivar auto_shrink: ``bool`` <False>.
+        Also makes the scene rect shrink back to the items bounding region
+        (but never smaller than the rect given to ``self.setSceneRect()``).
+
+    :ivar snap_candidates_count: ``int`` <0>.
+        Number of colli paths tested by the last dragged block on each move
+        (computed when the drag starts). Useful for tuning.
+
+    :ivar colli_paths_version: ``int`` <0>.
+        Incremented whenever a colli path is added to or removed from the
+        scene, so a dragged block knows when its snap candidates are stale
+        (e.g. after a deferred relayout rebuilt the colli paths).
+
+    :ivar cache_policy: ``visuino.gx.cache_policy.GxCachePolicy`` <None>.
+        Chooses the cache mode of the blocks. If None, blocks just get the
+        ``DeviceCoordinateCache`` mode.
+
+    :ivar insertion_markers_pool: ``dict`` of ``list``.
+        Hidden ``visuino.gx.connections.GxInsertionMarker`` objects waiting
+        to be reused, by notch kind (``'io'``/``'vf'``). They stay on the
+        scene, but with an empty bounding rect.
         
     :ivar _top_item: ``QGraphicsItem`` <None>.
         Holds the last item brought to the front. Therefore, changes with 
         ``self.bringToFront()``.
     
-    :ivar _top_z: ``float`` <None>.
-        zValue of the top-most item on the scene. Changes with 
-        ``self.bringToFront()``.
+    :ivar _top_z: ``int`` <0>.
+        zValue (integer layer) of the top-most item on the scene. Changes 
+        with ``self.bringToFront()``.
+
+    :ivar _z_order: ``OrderedDict``.
+        Items brought to the front, from the bottom-most to the top-most one
+        (values are not used). Allows finding the top item in O(1) and
+        renumbering the layers without changing the stacking order.
     '''
-    #: Increment on zValue for use on ``self.bringToFront()``
-    Z_INCREMENT = 0.0000000001       
+    #: When the top layer reaches this value, the z values of all the items
+    #: brought to the front are renumbered from 1 (see ``self.bringToFront()``)
+    Z_COMPACT_LIMIT = 2**20
+
+    #: Maximum number of recycled insertion markers kept for each notch kind
+    INSERTION_MARKERS_POOL_SIZE = 2
+
+    #: Distance between the background grid lines (scene units, zoom 100%)
+    GRID_SIZE = 20
+
+    #: Minimum distance between the grid lines on the screen (device pixels).
+    #: When zooming out, the grid gets coarser (doubling its size) to keep it.
+    GRID_MIN_PIXELS = 8
+
+    #: Maximum number of grid tiles kept (one per zoom and pixel ratio)
+    GRID_CACHE_SIZE = 8
+
+    GRID_BACKGROUND_COLOR = (219, 219, 219)
+    GRID_LINE_COLOR = (203, 203, 203)
+
+    #: Free space kept around the items when the scene rect is resized
+    SCENE_MARGIN = 200
+
+    #: Delay (ms) for resizing the scene rect after the items change, so
+    #: that many changes (e.g. every move of a drag) cost a single resize
+    SCENE_RECT_DELAY = 250
+
+    #: Limits for the BSP tree depth (see ``self.updateIndexing()``)
+    MIN_BSP_DEPTH, MAX_BSP_DEPTH = 5, 12
+
+    #: Desired number of items on each leaf of the BSP tree
+    BSP_ITEMS_PER_LEAF = 8
+
+    #: Minimum number of blocks (without counting the ones plugged on them)
+    #: for moveItems(), removeItems() and duplicateItems() to turn the
+    #: indexing off. Rebuilding the index costs more than updating it for a
+    #: few blocks, e.g. for an arrow key nudge or a single drop.
+    BULK_MIN_ITEMS = 8
+
+    # all the living scenes (see GxBlock.relayoutAll())
+    _instances = weakref.WeakSet()
 
     def __init__(self, parent=None, background_grid=True):
         '''
@@ -162,8 +471,13 @@ class GxSceneBlocks(QGraphicsScene):
             Enables drawing of a grid on the background layer of the scene.
         '''
         QGraphicsScene.__init__(self, parent)
+        GxSceneBlocks._instances.add(self)
         
         self.background_grid = background_grid
+        self.auto_grow = True
+        self.auto_shrink = False
+        self._bulk_loads = 0
+
         self.setSceneRect(0, 0, 800, 600)        
         self.setBackgroundBrush(QBrush(QColor('lightgray')))        
 ##        self.setItemIndexMethod(QGraphicsScene.NoIndex)
@@ -175,50 +489,447 @@ class GxSceneBlocks(QGraphicsScene):
         self.vf_male_colli_paths = set()
         self.vf_female_colli_paths = set()
         self.io_female_colli_paths = set()
+
+        # free female IO colli paths by argument type
+        self.io_female_slots = {}
+
+        # size of the snap candidates set of the last drag
+        self.snap_candidates_count = 0
+        self.colli_paths_version = 0
+
+        # set by the owner of the scene, if wanted
+        self.cache_policy = None
+
+        # recycled insertion markers (see visuino.gx.connections)
+        self.insertion_markers_pool = {'io': [], 'vf': []}
         
         # information about the top-most item (changes with "bringToFront")
         self._top_item = None
-        self._top_z = 0.0     
+        self._top_z = 0
+        self._z_order = OrderedDict()
+
+        # tiled grid brushes by (grid size, zoom, device pixel ratio)
+        self._grid_brushes = OrderedDict()
+
+        self._scene_rect_timer = QTimer(self)
+        self._scene_rect_timer.setSingleShot(True)
+        self._scene_rect_timer.setInterval(self.SCENE_RECT_DELAY)
+        self._scene_rect_timer.timeout.connect(self.updateSceneRect)
+
+    def setSceneRect(self, *args):
+        ''' *QGraphicsScene.setSceneRect(QRectF) -> NoneType*
         
+        The given rect is also the minimum one when auto resizing.
+        '''
+        QGraphicsScene.setSceneRect(self, *args)
+        self._base_scene_rect = self.sceneRect()
+
+    def scheduleSceneRectUpdate(self):
+        '''
+        Schedules a resize of the scene rect (see ``self.updateSceneRect()``)
+        after items were moved, added or removed. Calls made in a row (e.g.
+        while dragging) result in a single resize; nothing is done while
+        ``self.auto_grow`` is off or during a bulk load, which resizes the
+        rect when it ends.
+        '''
+        if self.auto_grow and not self._bulk_loads:
+            self._scene_rect_timer.start()
+
+    def updateSceneRect(self):
+        '''
+        Resizes the scene rect based on the items bounding region. When
+        growing, each exceeded side grows by at least half of the current
+        size, so a scene that keeps growing is resized only a few times.
+        '''
+        items_rect = self.itemsBoundingRect()
+        current, m = self.sceneRect(), self.SCENE_MARGIN
+
+        if self.auto_shrink:
+            new = items_rect.adjusted(-m, -m, m, m)\
+                            .united(self._base_scene_rect)
+        else:
+            new = QRectF(current)
+            dw, dh = max(m, current.width()/2), max(m, current.height()/2)
+            if items_rect.left() < current.left():
+                new.setLeft(items_rect.left() - dw)
+            if items_rect.right() > current.right():
+                new.setRight(items_rect.right() + dw)
+            if items_rect.top() < current.top():
+                new.setTop(items_rect.top() - dh)
+            if items_rect.bottom() > current.bottom():
+                new.setBottom(items_rect.bottom() + dh)
+
+        if new != current:
+            QGraphicsScene.setSceneRect(self, new)
+
+    def updateIndexing(self):
+        '''
+        Sets the BSP tree depth according to the number of items on the
+        scene, aiming at ``self.BSP_ITEMS_PER_LEAF`` items for each leaf.
+        The index is only rebuilt when the depth actually changes. Counting
+        the items is not free, so this is only called once per bulk load
+        (see ``self.endBulkLoad()``).
+        '''
+        if self.itemIndexMethod() != QGraphicsScene.BspTreeIndex:
+            return
+        n = len(self.items())
+        depth = int(math.ceil(math.log(max(n / self.BSP_ITEMS_PER_LEAF, 1), 
+                                       2)))
+        depth = min(self.MAX_BSP_DEPTH, max(self.MIN_BSP_DEPTH, depth))
+        if depth != self.bspTreeDepth():
+            self.setBspTreeDepth(depth)
+
+    def beginBulkLoad(self):
+        '''
+        Turns off the item indexing (and the scene rect resizing) while
+        lots of items are being added, e.g., when loading a sketch. Must be
+        paired with ``self.endBulkLoad()``; calls can be nested.
+        '''
+        if not self._bulk_loads:
+            self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self._bulk_loads += 1
+
+    def endBulkLoad(self):
+        '''
+        Turns the BSP indexing back on, with a depth suited to the new number
+        of items, and resizes the scene rect once. The pending relayouts (see
+        ``visuino.gx.layout``) are done first, so the index gets the final
+        geometry of the blocks.
+        '''
+        self._bulk_loads = max(self._bulk_loads - 1, 0)
+        if not self._bulk_loads:
+            LAYOUT_SCHEDULER.flush()
+            self.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            self.updateIndexing()
+            if self.auto_grow:
+                self._scene_rect_timer.stop()
+                self.updateSceneRect()
+
+    def getRootItems(self, items):
+        '''
+        :param items: ``list`` of ``QGraphicsItem``.
+        :return: ``list`` of ``QGraphicsItem`` - The given items that do not
+                 descend from another one of them (moving or removing these
+                 takes care of the others).
+        '''
+        items = set(items)
+        roots = []
+        for item in items:
+            parent = item.parentItem()
+            while parent is not None and parent not in items:
+                parent = parent.parentItem()
+            if parent is None:
+                roots.append(item)
+        return roots
+
+    def _detachItems(self, roots):
+        '''
+        Unplugs the given pluggable blocks from blocks that are not among
+        them, without updating the snippets of the stacks they leave.
+
+        :return: ``set`` - Top VF blocks whose snippets need an update.
+        '''
+        stacks = set()
+        for item in roots:
+            if getattr(item, 'parent_io', None):
+                item.unplugIo()
+            elif getattr(item, 'parent_vf', None):
+                stacks.add(item.parent_vf.getTopParentVf())
+                item.unplugVf(update_snippet=False)
+        return stacks
+
+    def moveItems(self, items, delta):
+        '''
+        Moves all the given items (e.g. the selected ones) by 'delta' at
+        once: for many items (see ``self.BULK_MIN_ITEMS``), the indexing is
+        off during the moves and the scene rect is resized only once.
+        Plugged blocks whose parent is not moving are unplugged first, as
+        when dragging them. Only the indexing is suspended: the snippets
+        are still updated once per affected stack.
+
+        :param items: ``list`` of ``QGraphicsItem``.
+        :param delta: ``QPointF``.
+        '''
+        roots = self.getRootItems(items)
+        bulk = len(roots) >= self.BULK_MIN_ITEMS
+        if bulk:
+            self.beginBulkLoad()
+        try:
+            stacks = self._detachItems(roots)
+            for item in roots:
+                item.moveBy(delta.x(), delta.y())
+        finally:
+            if bulk:
+                self.endBulkLoad()
+        if not bulk:
+            self.scheduleSceneRectUpdate()
+
+        for block in stacks:
+            block.updateMySnippet()
+        for item in roots:
+            if hasattr(item, 'updateMySnippetPos'):
+                item.updateMySnippetPos()
+
+    def removeItems(self, items):
+        '''
+        Removes all the given blocks (along with the blocks plugged on them)
+        at once, through their ``removeFromScene()`` (with the indexing off,
+        for many blocks). Only the indexing is suspended: each block still
+        updates the colli path sets (and ``self.colli_paths_version``) as
+        it goes, and the snippets are updated once per affected stack.
+
+        :param items: ``list`` of ``GxBlock``.
+        '''
+        roots = self.getRootItems(x for x in items if x.scene() is self)
+        bulk = len(roots) >= self.BULK_MIN_ITEMS
+        if bulk:
+            self.beginBulkLoad()
+        try:
+            stacks = self._detachItems(roots)
+            for item in roots:
+                item.removeFromScene()
+        finally:
+            if bulk:
+                self.endBulkLoad()
+        if not bulk:
+            self.scheduleSceneRectUpdate()
+
+        for block in stacks:
+            if block.scene() is self:
+                block.updateMySnippet()
+
+    def duplicateItems(self, items, offset=None):
+        '''
+        Creates copies of the given blocks (each one along with the blocks
+        plugged on it) as new snippets, 'offset' away from the originals.
+        The copies become the selection.
+
+        :param items: ``list`` of ``visuino.gx.connections.GxPluggableBlock``.
+        :param offset: ``QPointF`` <None>. If None, (20, 20).
+        :return: ``list`` of ``GxPluggableBlock`` - First block of each copy.
+        '''
+        if offset is None:
+            offset = QPointF(20, 20)
+        roots = [x for x in self.getRootItems(items)
+                 if getattr(x, 'sketch', None) or
+                    getattr(x.getTopParentVf(), 'sketch', None)]
+        copies = []
+        bulk = len(roots) >= self.BULK_MIN_ITEMS
+        if bulk:
+            self.beginBulkLoad()
+        try:
+            for item in roots:
+                sketch = item.sketch or item.getTopParentVf().sketch
+                body = [x.element for x in item.getVfChain()]
+                new_block = sketch.drawNewSnippet(body,
+                    item.scenePos() + offset, self, item.palette_blocks)
+                self.bringToFront(new_block)
+                copies.append(new_block)
+        finally:
+            if bulk:
+                self.endBulkLoad()
+
+        self.clearSelection()
+        for block in copies:
+            block.setSelected(True)
+        return copies
+
+    def registerIoSlot(self, colli_path, arg_type):
+        '''
+        Adds a free female IO colli path on the type index.
+        
+        :param colli_path: ``visuino.gx.connections.GxColliPath``.
+        :param arg_type: ``str``. Type accepted by the slot (may be None).
+        '''
+        self.io_female_slots.setdefault(arg_type, set()).add(colli_path)
+
+    def unregisterIoSlot(self, colli_path):
+        '''
+        Removes a female IO colli path from the type index, if there.
+        
+        :param colli_path: ``visuino.gx.connections.GxColliPath``.
+        '''
+        for slots in self.io_female_slots.values():
+            if colli_path in slots:
+                slots.remove(colli_path)
+                return
+
+    def getFreeIoSlots(self, io_type):
+        '''
+        :param io_type: ``str``. Type of the value to be plugged (may be None).
+        :return: ``list`` of ``visuino.gx.connections.GxColliPath`` - The
+                 free female IO colli paths that accept the given type.
+        '''
+        result = []
+        for arg_type, slots in self.io_female_slots.items():
+            if io_type in NO_TYPE or types_compatible(arg_type, io_type):
+                result.extend(slots)
+        return result
+
     def getTopItem(self):
         ''' 
-        :return: ``QGraphicsItem`` - The top-most item on the scene.
+        :return: ``QGraphicsItem`` - The top-most item brought to the front
+                 (see ``self.bringToFront()``), or None if there is none.
         '''
-        if self._top_item:
-            return self._top_item
-        else:
-            items = self.items()
-            if items:
-                return items[0]
+        # items removed without removeItem() (e.g. through a parent item,
+        # or deleted by Qt along with it) are skipped here
+        while self._z_order:
+            item = next(reversed(self._z_order))
+            try:
+                on_scene = item.scene() is self
+            except RuntimeError:
+                # the C++ item was deleted, only the wrapper is left
+                on_scene = False
+            if on_scene:
+                self._top_item = item
+                return item
+            del self._z_order[item]
+
+        self._top_item = None
+        return None
 
     def bringToFront(self, item):
         '''
         Make the given item the top-most on the scene by setting properly
-        a new zValue (if necessary).
+        a new zValue (if necessary), one layer above the current top item.
         
         :param item: ``QGraphicsItem``.        
         '''
-        if item != self._top_item:
-            item.setZValue(self._top_z + self.Z_INCREMENT)
-            self._top_z = item.zValue()
-            self._top_item = item        
+        if item is self._top_item:
+            return
+        if self._top_z >= self.Z_COMPACT_LIMIT:
+            self._compactZValues()
+
+        self._z_order.pop(item, None)
+        self._z_order[item] = None
+        self._top_z += 1
+        item.setZValue(self._top_z)
+        self._top_item = item
+
+    def _compactZValues(self):
+        '''
+        Renumbers the layers of the items brought to the front as 1, 2, ...
+        keeping their stacking order (so the items are not reordered), and
+        forgets the items that are no longer on the scene.
+        '''
+        items = [x for x in self._z_order if x.scene() is self]
+        self._z_order = OrderedDict((x, None) for x in items)
+        for z, item in enumerate(items, 1):
+            item.setZValue(z)
+        self._top_z = len(items)
+
+    def _forgetLayers(self, item):
+        '''
+        Forgets the layers of the item and of its descendants (which leave
+        the scene along with it).
+
+        :param item: ``QGraphicsItem``.
+        '''
+        self._z_order.pop(item, None)
+        if item is self._top_item:
+            self._top_item = None
+        for child in item.childItems():
+            self._forgetLayers(child)
+
+    def removeItem(self, item):
+        ''' *QGraphicsScene.removeItem(QGraphicsItem) -> NoneType*
+
+        Also forgets the layers of the item and of its descendants.
+        '''
+        if self._z_order:
+            self._forgetLayers(item)
+        QGraphicsScene.removeItem(self, item)
+
+    def clear(self):
+        ''' *QGraphicsScene.clear() -> NoneType*
+
+        Also forgets all the layers and the pooled insertion markers.
+        '''
+        for markers in self.insertion_markers_pool.values():
+            del markers[:]
+        self._z_order.clear()
+        self._top_item = None
+        self._top_z = 0
+        QGraphicsScene.clear(self)
+
+    def _getGridBrush(self, scale, ratio):
+        '''
+        Returns a brush whose texture is a single grid tile, rendered on the
+        device resolution for the given zoom. Tiles are cached, so they are
+        only rendered once for each zoom level (the least recently used
+        tile is dropped when there are ``self.GRID_CACHE_SIZE`` of them).
+        
+        :param scale: ``float``. Zoom factor of the painter.
+        :param ratio: ``float``. Device pixel ratio of the paint device.
+        :return: ``QBrush``.
+        '''
+        step = self.GRID_SIZE
+        while step * scale < self.GRID_MIN_PIXELS:
+            step *= 2
+
+        key = (step, round(scale, 3), ratio)
+        brush = self._grid_brushes.pop(key, None)
+        if brush is None:
+            size = max(1, int(round(step * scale * ratio)))
+            offset = min(size - 1, int(scale * ratio))
+
+            tile = QPixmap(size, size)
+            tile.fill(QColor(*self.GRID_BACKGROUND_COLOR))
+            painter = QPainter(tile)
+            painter.setPen(QPen(QColor(*self.GRID_LINE_COLOR)))
+            painter.drawLine(offset, 0, offset, size)
+            painter.drawLine(0, offset, size, offset)
+            painter.end()
+
+            # one tile (size pixels) must cover one grid step (scene units)
+            brush = QBrush(tile)
+            brush.setTransform(QTransform.fromScale(step/size, step/size))
+
+            if len(self._grid_brushes) >= self.GRID_CACHE_SIZE:
+                self._grid_brushes.popitem(last=False)
+        self._grid_brushes[key] = brush
+        return brush
 
     def drawBackground(self, painter, rect):
         ''' *QGraphicsScene.drawBrackground(QPainter, QRectF) -> NoneType*
 
-        If ``self.background_grid`` flag is ``True``, then draws a series of 
-        vertical and horizontal paralell lines to form a squared grid.
+        If ``self.background_grid`` flag is ``True``, then fills the exposed
+        part of the scene rect with a tiled grid brush (see 
+        ``self._getGridBrush()``), on which the grid gets coarser as the
+        view zooms out. The tiles carry the background color, so each pixel
+        is filled only once: the base implementation is skipped and the
+        exposed parts out of the scene rect just get the plain color.
         '''
-        QGraphicsScene.drawBackground(self, painter, rect)
-        if self.background_grid:
-            painter.setPen(QPen(QColor(203, 203, 203)))
-            painter.fillRect(rect, QColor(219, 219, 219))
-
-            W, H = self.sceneRect().width(), self.sceneRect().height()
-            for i in range(1, int(W), 20):
-                painter.drawLine(i, 0, i, H)
-            for j in range(1, int(H), 20):
-                painter.drawLine(0, j, W, j)
+        if not self.background_grid:
+            QGraphicsScene.drawBackground(self, painter, rect)
+            return
+
+        grid_rect = rect.intersected(self.sceneRect())
+        if grid_rect.isEmpty():
+            painter.fillRect(rect, QColor(*self.GRID_BACKGROUND_COLOR))
+            return
+        if grid_rect != rect:
+            color, g = QColor(*self.GRID_BACKGROUND_COLOR), grid_rect
+            for band in (QRectF(QPointF(rect.left(), rect.top()),
+                                QPointF(rect.right(), g.top())),
+                         QRectF(QPointF(rect.left(), g.bottom()),
+                                QPointF(rect.right(), rect.bottom())),
+                         QRectF(QPointF(rect.left(), g.top()),
+                                QPointF(g.left(), g.bottom())),
+                         QRectF(QPointF(g.right(), g.top()),
+                                QPointF(rect.right(), g.bottom()))):
+                if band.width() > 0 and band.height() > 0:
+                    painter.fillRect(band, color)
+
+        t = painter.worldTransform()
+        scale = (t.m11()**2 + t.m12()**2) ** 0.5
+        try:
+            ratio = painter.device().devicePixelRatio()
+        except AttributeError:
+            # Qt 4 has no high DPI support
+            ratio = 1
+
+        painter.fillRect(grid_rect, self._getGridBrush(scale, ratio))
 
     def mousePressEvent(self, event):
         ''' *QGraphicsScene.mousePressEvent(QGraphicsSceneMouseEvent) -> NoneType*
@@ -271,6 +982,14 @@ class GxBlock(QGraphicsItem):
         See ``self.checksPaletteCollide()``. Should be set only by the palette
         itself.
     '''
+    #: Level of detail tiers, from the most detailed (see ``self.getLodTier()``)
+    LOD_FULL, LOD_SIMPLE, LOD_FLAT = 0, 1, 2
+
+    #: Name of the style section (``VGS['styles']``) holding the ``lod_simple``
+    #: and ``lod_flat`` thresholds of this kind of block. If None, the block
+    #: is always drawn with full detail.
+    LOD_STYLE = None
+
     def __init__(self, scene, parent=None):
         '''
         :param scene: ``GxSceneBlocks``.
@@ -281,6 +1000,12 @@ class GxBlock(QGraphicsItem):
         QGraphicsItem.__init__(self, parent, scene)
         self._width, self._height = 200, 100
 
+        # incremented by paint() (see visuino.gx.cache_policy)
+        self.paint_count = 0
+
+        # waiting for a layout pass (see visuino.gx.layout)
+        self._layout_dirty = False
+
         path = QPainterPath()
         path.addRect(self.boundingRect())
         self._border_path = path
@@ -317,6 +1042,61 @@ class GxBlock(QGraphicsItem):
         '''
         return QRectF(0, 0, self._width, self._height)
 
+    def getLodThresholds(self):
+        '''
+        Can be re-implemented by blocks that want their own tiers.
+        
+        :return: ``tuple`` of ``(float, int)`` - Pairs of (minimum level of 
+                 detail, tier), from the lowest detail tier up. 
+        '''
+        if self.LOD_STYLE is None:
+            return ()
+        style = VGS['styles'][self.LOD_STYLE]
+        return ((style.get('lod_flat', 0), self.LOD_FLAT),
+                (style.get('lod_simple', 0), self.LOD_SIMPLE))
+
+    def getLodTier(self, painter, option):
+        '''
+        :param painter: ``QPainter``. The one given to ``self.paint()``.
+        :param option: ``QStyleOptionGraphicsItem`` <None>.
+        :return: ``int`` - One of ``self.LOD_FULL``, ``self.LOD_SIMPLE`` or
+                 ``self.LOD_FLAT``, according to the current zoom.
+        '''
+        if option is None:
+            return self.LOD_FULL
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        for threshold, tier in self.getLodThresholds():
+            if lod < threshold:
+                return tier
+        return self.LOD_FULL
+
+    def paintLowDetail(self, painter, option, color, corner_size=(0, 0)):
+        '''
+        Draws the block on the low detail tiers: filled rounded rect without
+        text (``self.LOD_SIMPLE``) or flat rect (``self.LOD_FLAT``). 
+        Meant to be called at the beginning of ``self.paint()``::
+        
+            if self.paintLowDetail(painter, option, color):
+                return
+
+        :param color: ``QColor``. Color used to fill the block.
+        :param corner_size: ``tuple`` of 2 ``number``.
+        :return: ``bool`` - ``True`` if the block was drawn (i.e. it is not
+                 on the full detail tier).
+        '''
+        tier = self.getLodTier(painter, option)
+        if tier == self.LOD_FULL:
+            return False
+
+        rect = self._border_path.boundingRect()
+        if tier == self.LOD_FLAT:
+            painter.fillRect(rect, color)
+        else:
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(color)
+            painter.drawRoundedRect(rect, corner_size[0], corner_size[1])
+        return True
+
     def shape(self):
         '''        
         :return: ``QPainterPath`` - Item delimiting shape.
@@ -341,10 +1121,43 @@ class GxBlock(QGraphicsItem):
                 self._border_path = path
         
                 self.update(self.boundingRect())
-            
+                self.requestParentLayout()
+
+        Blocks whose size depends on their children are relaid out by
+        ``visuino.gx.layout.LAYOUT_SCHEDULER`` after them, once per event
+        loop tick; implementations should set ``self._layout_dirty`` to
+        False, since they have just been computed.
         ''' 
         pass        
 
+    @classmethod
+    def relayoutAll(cls):
+        '''
+        Marks all the blocks of this class, on every ``GxSceneBlocks``, to
+        have their metrics updated on the next layout pass (their parents
+        follow on the same pass). Meant for style changes, see
+        ``visuino.settings.StyleStore.subscribe()``.
+        '''
+        for scene in list(GxSceneBlocks._instances):
+            try:
+                items = scene.items()
+            except RuntimeError:
+                # the underlying C++ scene has already been deleted
+                continue
+            for item in items:
+                if isinstance(item, cls):
+                    LAYOUT_SCHEDULER.markDirty(item)
+
+    def requestParentLayout(self):
+        '''
+        Marks the parent block (if any) to have its metrics updated on the
+        next layout pass. Should be called at the end of
+        ``self.updateMetrics()`` by blocks that may be nested.
+        '''
+        parent = self.parentItem()
+        if isinstance(parent, GxBlock):
+            LAYOUT_SCHEDULER.markDirty(parent)
+
     def cloneMe(self, scene):
         ''' *TO BE RE-IMPLEMENTED*
         
@@ -419,23 +1232,31 @@ class GxBlock(QGraphicsItem):
     def mouseReleaseEvent(self, event):
         ''' *QGraphicsItem.mouseReleaseEvent(QGraphicsSceneMouseEvent) -> NoneType*
         
-        If it is colliding with the palette, then remove itself from the scene.
-        '''   
+        If it is colliding with the palette, then remove itself from the scene
+        (along with the selected blocks also dropped on the palette).
+        Otherwise, the scene rect may need to grow to contain the dropped
+        blocks.
+        '''
         QGraphicsItem.mouseReleaseEvent(self, event)
-        
+
         # this is for the case when de item is grabbed on the mouse by
         # the palette, and not by some mouse click event (drag and drop)
         mouse_grabber = self.scene().mouseGrabberItem()
         if mouse_grabber and mouse_grabber is self:
             self.ungrabMouse()
-        
+
         if self.palette_blocks:
-            scene = self.scene() 
-            if self.collidesWithItem(self.palette_blocks):
-                self.removeFromScene()
-            for item in scene.selectedItems():
-                if item and item.collidesWithItem(item.palette_blocks):
-                    item.removeFromScene()                  
+            scene = self.scene()
+            # a single (indexed) query instead of testing each block
+            colliding = set(scene.collidingItems(self.palette_blocks))
+            dropped = [x for x in [self] + scene.selectedItems()
+                       if x in colliding]
+            if dropped:
+                scene.removeItems(dropped)
+
+        scene = self.scene()
+        if scene and hasattr(scene, 'scheduleSceneRectUpdate'):
+            scene.scheduleSceneRectUpdate()
 
 
 # ------------------------------------------------------------------------------
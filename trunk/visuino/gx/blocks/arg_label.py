@@ -21,8 +21,11 @@ from visuino.gx.bases import *
 from visuino.gx.shapes import *
 from visuino.gx.utils import *
 from visuino.gx.connections import *
+from visuino.gx.hud import FRAME_STATS
+from visuino.gx.text_metrics import TEXT_METRICS
+from visuino.utils import trace_register
 
-from visuino.settings import VGS
+from visuino.settings import VGS, STYLES
 
 __all__ = ['GxArgLabel']
 
@@ -32,20 +35,19 @@ class GxArgLabel(GxPluggableBlock):
     It has a female IO notch on the right and resizes itself according to the 
     plugged male IO block.
     '''
+    LOD_STYLE = 'block_arg_label'
 
     def __init__(self, arg_info, scene=None, parent=None, **kwargs):
         ''' (dict, GxSceneBlocks, GxBlock, **)
 
         kwargs:
             @ fixed_width: number <None>
-            @ update_parent: True <False>
         '''
         GxPluggableBlock.__init__(self, scene, parent)
         self.mouse_active = False
         self._arg_info = arg_info
 
         self._fixed_width = kwargs.get('fixed_width', None)
-        self.update_parent = kwargs.get('update_parent', True)
         
         self._name_rect = self.boundingRect()
         self._name_font = QFont('Verdana', 12)
@@ -64,31 +66,45 @@ class GxArgLabel(GxPluggableBlock):
             return None
 
     def getBorderWidth(self):
-        return VGS['styles']['block_arg_label']['border_width']      
+        return STYLES.getStyle('block_arg_label').border_width
+
+    def getArgType(self):
+        ''' GxPluggableBlock.getArgType() -> str <None>
+        '''
+        return self._arg_info.get('type')
 
     def setFixedWidth(self, width):
         ''' (number) -> NoneType
         '''
+        if width == self._fixed_width:
+            return
         self._fixed_width = width
         self.updateMetrics()
 
+    def getNaturalWidth(self):
+        ''' () -> number
+
+        Width that getWidth() would return without a fixed width.
+        '''
+        return self._natural_width
+
     def paint(self, painter, option=None, widget=None):
         ''' QGraphicsItem.paint(QPainter, QStyleOptionGraphicsItem,
                                 QWidget widget=None) -> NoneType
         '''
-        sa = VGS['styles']['block_arg_label']
+        FRAME_STATS.items_painted += 1
+        self.paint_count += 1
+        sa = STYLES.getStyle('block_arg_label')
         painter.fillRect(self.boundingRect(), Qt.transparent)
 
-        # drawing the filled border path
-        painter.setPen(QPen(QColor(sa['border_color']), sa['border_width'],
-                            Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
-        painter.setBrush(QColor(sa['background_color']))
-        painter.drawPath(self._border_path)
+        if self.paintLowDetail(painter, option, sa.background_color,
+                (sa.corner_size.width(), sa.corner_size.height())):
+            return
 
-        # drawing the name
-        painter.setFont(self._name_font)
-        painter.setPen(QPen(QColor(sa['font_color'])))
-        painter.drawText(self._name_rect, Qt.AlignCenter, self._arg_info['name'])
+        # drawing the filled border path and the name
+        sa.paintPath(painter, self._border_path)
+        sa.paintText(painter, self._name_rect, Qt.AlignCenter,
+                     self._arg_info['name'])
 
         # drawing the name rectangle (for debugging purposes)
 ##        painter.setPen(Qt.DashLine)
@@ -100,18 +116,21 @@ class GxArgLabel(GxPluggableBlock):
 
         Recreates its border path based on the current styles.
         '''
+        FRAME_STATS.update_metrics += 1
+        self._layout_dirty = False
         self.prepareGeometryChange()
 
         sa, sn = VGS['styles']['block_arg_label'], VGS['styles']['notch']       
 
-        self._name_font = QFont(sa['font_family'], sa['font_size'])
+        family, size = sa['font_family'], sa['font_size']
+        self._name_font = TEXT_METRICS.getFont(family, size)
 
         # border corrections
         bw = sa['border_width']/2
 
         # main dimensions
-        metrics = QFontMetricsF(self._name_font)
-        nw, nh = metrics.width(self._arg_info['name']), metrics.height()
+        nw, nh = TEXT_METRICS.getTextSize(family, size, -1,
+                                          self._arg_info['name'])
         fvc = sa['font_vcorrection']
         hp, vp = sa['padding']['horizontal'], sa['padding']['vertical']
         cw, ch = sa['corner_size']['width'], sa['corner_size']['height']
@@ -137,6 +156,7 @@ class GxArgLabel(GxPluggableBlock):
 
         if self.child_io:
             H = self.child_io.getHeight()
+        natural_W = W
         if self._fixed_width is not None:
             W = self._fixed_width
 
@@ -157,6 +177,7 @@ class GxArgLabel(GxPluggableBlock):
         self.io_female_start, io_y0 = path.currentPosition(), path.y
         path.closeSubpath()
         self._border_path = path
+        self._natural_width = path.boundingRect().width() - W + natural_W
 
         # updating the size considering border extra pixels
         self._width, self._height = W + 2*bw, H + 2*bw
@@ -168,10 +189,7 @@ class GxArgLabel(GxPluggableBlock):
         self.updateConnections()
 
         self.update(self.boundingRect())
-
-        if self.update_parent:
-            if isinstance(self.parentItem(), GxBlock):
-                self.parentItem().updateMetrics()
+        self.requestParentLayout()
 
     def updateElement(self, new_element):
         ''' (dict)
@@ -184,7 +202,12 @@ class GxArgLabel(GxPluggableBlock):
                 break
 #        print('Updated parent fc element on arg %d..' % i)
         parent_fc.element['args'][i] = new_element
-            
+
+trace_register(GxArgLabel, ('updateMetrics', 'paint'), 'gx')
+
+STYLES.subscribe(['block_arg_label', 'notch'],
+                 lambda section, key: GxArgLabel.relayoutAll())
+
 
 class HollowItem(object):
     def __init__(self, height, y0):
@@ -239,10 +262,10 @@ class WinCustomizeArgLabel(QMainWindow):
         
         self.hollow_item = HollowItem(200, 20) 
         
-        sa, sn = VGS['styles']['block_arg_label'], VGS['styles']['notch']
+        sa, sn = 'block_arg_label', 'notch'
         
-        self._setupSignal(self.ui.spinbox_hpadd, sa['padding'], 'horizontal')        
-        self._setupSignal(self.ui.spinbox_vpadd, sa['padding'], 'vertical') 
+        self._setupSignal(self.ui.spinbox_hpadd, sa, 'padding.horizontal')
+        self._setupSignal(self.ui.spinbox_vpadd, sa, 'padding.vertical')
         self._setupSignal(self.ui.spinbox_font_vcorrection, sa) 
         
         self._setupSignal(self.ui.spinbox_font_size, sa)
@@ -255,17 +278,15 @@ class WinCustomizeArgLabel(QMainWindow):
         
         self._setupSignal(self.ui.combobox_corner_shape, sa)
 
-        self._setupSignal(self.ui.spinbox_corner_width, sa['corner_size'], 
-                          'width')
-        self._setupSignal(self.ui.spinbox_corner_height, sa['corner_size'], 
-                          'height')
+        self._setupSignal(self.ui.spinbox_corner_width, sa,
+                          'corner_size.width')
+        self._setupSignal(self.ui.spinbox_corner_height, sa,
+                          'corner_size.height')
                           
         self._setupSignal(self.ui.combobox_io_shape, sn)
         self._setupSignal(self.ui.slider_io_basis, sn)
-        self._setupSignal(self.ui.spinbox_io_width, sn['io_size'], 
-                          'width')
-        self._setupSignal(self.ui.spinbox_io_height, sn['io_size'], 
-                          'height')                        
+        self._setupSignal(self.ui.spinbox_io_width, sn, 'io_size.width')
+        self._setupSignal(self.ui.spinbox_io_height, sn, 'io_size.height')
    
         self.ui.checkbox_plug_io.stateChanged[int].connect(
             self._updatePluggedIO)
@@ -275,40 +296,43 @@ class WinCustomizeArgLabel(QMainWindow):
             self._updatePluggedIO)
 
 
-    def _setupSignal(self, sender, style, attr=None):
+    def _setupSignal(self, sender, section, attr=None):
         '''
         :param sender: ``QObject``
-        :param style: ``dict``
+        :param section: ``str``
+            Style section (key on VGS['styles'])
         :param attr: ``str`` <None>
-            Attribute name (key on the style dict)
+            Attribute name (key on the section, see ``STYLES.get()``)
         '''        
         if attr is None:
             n = str(sender.objectName())
             attr = n[n.find('_')+1:]
             
-        if attr not in style:
+        try:
+            value = STYLES.get(section, attr)
+        except KeyError:
             return
             
         if isinstance(sender, QSpinBox):
-            sender.setValue(int(style[attr]))
+            sender.setValue(int(value))
             sender.valueChanged[int].connect(
-                lambda: self._updateStyle(style, attr, sender.value()))
+                lambda: self._updateStyle(section, attr, sender.value()))
 
         elif isinstance(sender, QComboBox):
-            sender.setCurrentIndex(sender.findText(str(style[attr])))
+            sender.setCurrentIndex(sender.findText(str(value)))
             sender.currentIndexChanged[int].connect(
-                lambda: self._updateStyle(style, attr,
+                lambda: self._updateStyle(section, attr,
                                           str(sender.currentText())))
 
         elif isinstance(sender, QSlider):
-            sender.setValue(int(style[attr])*100)
+            sender.setValue(int(value)*100)
             sender.valueChanged[int].connect(
-                lambda: self._updateStyle(style, attr,
+                lambda: self._updateStyle(section, attr,
                                           float(sender.value()/100)))
                                           
         elif isinstance(sender, QFrame) and not isinstance(sender, QLabel):
             palette = sender.palette()
-            palette.setColor(QPalette.Background, QColor(style[attr]))
+            palette.setColor(QPalette.Background, QColor(value))
             sender.setPalette(palette)
             sender.mousePressEvent = \
                 lambda event: self._chooseColor(sender, attr)
@@ -321,7 +345,7 @@ class WinCustomizeArgLabel(QMainWindow):
         Changes on the dialog are reflected immediately on the GxArgLabel.
         If the dialog is cancelled, restores 'old_color'.
         '''
-        palette, sa = frame.palette(), VGS['styles']['block_arg_label']
+        palette, sa = frame.palette(), 'block_arg_label'
         old_color = palette.background().color()
         color_dialog = QColorDialog(old_color)
 
@@ -339,9 +363,13 @@ class WinCustomizeArgLabel(QMainWindow):
             self._updateStyle(sa, attr, str(old_color.name()))
 
         
-    def _updateStyle(self, style, attr, value):
-        style[attr] = value
-        self.arg_label.updateMetrics()
+    def _updateStyle(self, section, attr, value):
+        ''' (str, str, object) -> NoneType
+
+        The arg labels (and their parents) get relaid out by the style
+        subscriptions.
+        '''
+        STYLES.set(section, attr, value)
 
     def _updatePluggedIO(self):
         if self.ui.checkbox_plug_io.isChecked():
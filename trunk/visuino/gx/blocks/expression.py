@@ -22,6 +22,7 @@ from visuino.gx.bases import *
 from visuino.gx.connections import *
 from visuino.gx.utils import *
 from visuino.gx.shapes import *
+from visuino.gx.text_metrics import TEXT_METRICS
 
 from visuino.settings import VGS
 
@@ -212,7 +213,6 @@ class EditInputField(QLineEdit):
         QLineEdit.__init__(self)
 
         self._field_parent = field_parent
-        self._metrics = QFontMetrics(self.font())
 
         self.connect(self, SIGNAL('textChanged(const QString&)'),
                      self._onTextChanged)
@@ -231,7 +231,6 @@ class EditInputField(QLineEdit):
         :font: QFont().
         """
         QLineEdit.setFont(self, font)
-        self._metrics = QFontMetrics(font)
         self.updateWidth()
 
     def updateWidth(self):
@@ -239,8 +238,10 @@ class EditInputField(QLineEdit):
         Update its x-dimension and also call updateMetrics() on the
         GxField parent, if any.
         """
-        min_width = self._metrics.width('MMi')
-        new_width = self._metrics.width(self.text())
+        font = self.font()
+        min_width = int(round(TEXT_METRICS.getFontTextWidth(font, 'MMi')))
+        new_width = int(round(TEXT_METRICS.getFontTextWidth(font,
+                                                            self.text())))
         if len(self.text()) > 2:
             self.setFixedWidth(new_width + 10)
         else:
@@ -10,6 +10,7 @@
 #-------------------------------------------------------------------------------
 from __future__ import division, print_function
 import sys
+from collections import OrderedDict
 if __name__ == '__main__':
     sys.path.append('../../../')
 
@@ -21,9 +22,12 @@ from visuino.gx.bases import *
 from visuino.gx.shapes import *
 from visuino.gx.utils import *
 from visuino.gx.connections import *
+from visuino.gx.hud import FRAME_STATS
+from visuino.gx.text_metrics import TEXT_METRICS
+from visuino.utils import trace_register
 from visuino.gx.blocks.arg_label import GxArgLabel
 
-from visuino.settings import VGS
+from visuino.settings import VGS, STYLES
 
 __all__ = ['GxBlockFunctionCall']
 
@@ -50,6 +54,12 @@ class GxBlockFunctionCall(GxPluggableBlock):
         _args_height: number. Total height of the GxArgLabel objects in
             self._args_labels, including the spacing between them.
             Gets updated via updateMetrics().
+
+        _geometry_cache: OrderedDict (class attribute). Geometry computed by
+            _buildGeometry(), shared by all the blocks with the same name,
+            return, argument label sizes and style versions (of the
+            'block_function_call' and 'notch' sections), on the order of the
+            last use (most recent at the end).
     '''
 
     MSG_ERR_TYPE_ARGS = \
@@ -60,6 +70,14 @@ class GxBlockFunctionCall(GxPluggableBlock):
         "On GxBlockFunctionCall.__init__(), parameter 'args', invalid value"\
         " in position %d. Expected <class 'FieldInfo'>, but was given %s."        
 
+    LOD_STYLE = 'block_function_call'
+
+    # maximum number of entries on _geometry_cache (the least recently used
+    # ones are dropped)
+    GEOMETRY_CACHE_SIZE = 512
+
+    _geometry_cache = OrderedDict()
+
     def __init__(self, definition, scene):
         ''' (dict, GxSceneBlocks, QGraphicsItem)
         '''
@@ -79,9 +97,6 @@ class GxBlockFunctionCall(GxPluggableBlock):
 
         self.setupArgLabels()
         self.updateMetrics()
-
-        for arg in self._args_labels:
-            arg.update_parent = True
             
     def __repr__(self):
         return "<GxBlockFunctionCall '%s'>" % str(self._def['name'])
@@ -97,7 +112,12 @@ class GxBlockFunctionCall(GxPluggableBlock):
     def getBorderWidth(self):
         ''' () -> int
         '''
-        return VGS['styles']['block_function_call']['border_width']
+        return STYLES.getStyle('block_function_call').border_width
+
+    def getIoType(self):
+        ''' GxPluggableBlock.getIoType() -> str <None>
+        '''
+        return self._def['return_type'] or None
             
     def cloneMe(self, scene):
         ''' (GxSceneBlocks) -> GxBlockFunctionCall
@@ -108,20 +128,19 @@ class GxBlockFunctionCall(GxPluggableBlock):
         ''' QGraphicsItem.paint(QPainter, QStyleOptionGraphicsItem,
                                 QWidget widget=None) -> NoneType
         '''
-        sfc = VGS['styles']['block_function_call']
+        FRAME_STATS.items_painted += 1
+        self.paint_count += 1
+        sfc = STYLES.getStyle('block_function_call')
 
         painter.fillRect(self.boundingRect(), Qt.transparent)
 
-        painter.setPen(QPen(
-            QBrush(QColor(sfc['border_color'])), sfc['border_width'],
-            Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
-        painter.setBrush(QColor(sfc['background_color']))
-        painter.drawPath(self._border_path)
+        if self.paintLowDetail(painter, option, sfc.background_color,
+                (sfc.corner_size.width(), sfc.corner_size.height())):
+            return
 
-        painter.setFont(self._name_font)
-        painter.setPen(QPen(QColor(sfc['name_font_color'])))
-        painter.drawText(self._name_rect, Qt.AlignVCenter | Qt.AlignLeft, 
-                         self._def['name'])
+        sfc.paintPath(painter, self._border_path)
+        sfc.paintText(painter, self._name_rect, Qt.AlignVCenter | Qt.AlignLeft,
+                      self._def['name'], 'name_')
 
         if self.isSelected():
             painter.setPen(Qt.DashLine)
@@ -141,31 +160,80 @@ class GxBlockFunctionCall(GxPluggableBlock):
             arg.removeFromScene()
         self._args_labels = []
 
-        max_width = 0
         self._args_height = 0
         for i, arg_info in enumerate(self._def['args']):
 
-            new_label = GxArgLabel(arg_info, self.scene(), parent=self,
-                                   update_parent=False)
+            new_label = GxArgLabel(arg_info, self.scene(), parent=self)
             new_label.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
             new_label.setPos(0, i*50)
 ##                new_label.setVisible(False)
-            w = new_label.getWidth()
-
-            max_width = w if w > max_width else max_width
             self._args_labels.append(new_label)
 
+        self._fitArgLabels()
+
+    def _fitArgLabels(self):
+        ''' () -> NoneType
+
+        Gives all the argument labels the width of the widest one.
+        '''
+        if not self._args_labels:
+            return
+        max_width = max(arg.getNaturalWidth() for arg in self._args_labels)
         for arg in self._args_labels:
             arg.setFixedWidth(max_width)
-            arg.update_parent = True
     
 
     def updateMetrics(self):
         ''' () -> NoneType
         '''
+        FRAME_STATS.update_metrics += 1
+        # the labels may have changed their natural width (e.g. by a style
+        # change); fitting them marks this block again, so it comes first
+        self._fitArgLabels()
+        self._layout_dirty = False
         self.prepareGeometryChange()
         self.old_size = self.boundingRect().size()
 
+        # the geometry only depends on the name width, the presence of the
+        # return notch, the argument label sizes and the styles
+        key = (self._def['name'], bool(self._def['return_type']),
+               tuple((arg.getWidth(), arg.getHeight())
+                     for arg in self._args_labels),
+               STYLES.getVersion('block_function_call', 'notch'))
+        cache = GxBlockFunctionCall._geometry_cache
+        geometry = cache.pop(key, None)
+        if geometry is None:
+            geometry = self._buildGeometry()
+            if len(cache) >= self.GEOMETRY_CACHE_SIZE:
+                cache.popitem(last=False)
+        cache[key] = geometry
+
+        (border_path, name_rect, self._args_height, self._width,
+         self._height, args_pos, io_male, vf_female, vf_male) = geometry
+
+        # the Qt values are mutable, so each block keeps its own copies
+        # (cheap: paths are implicitly shared until modified)
+        self._border_path = QPainterPath(border_path)
+        self._name_rect = QRectF(name_rect)
+        self.io_male_start = QPointF(io_male) if io_male else None
+        self.vf_female_start = QPointF(vf_female) if vf_female else None
+        self.vf_male_start = QPointF(vf_male) if vf_male else None
+        for arg, pos in zip(self._args_labels, args_pos):
+            arg.setPos(pos)
+
+#        print('Updating connectors GxBlockFunctionCall ', self._name)
+        self.updateConnections()
+        self.update(self.boundingRect())
+        self.requestParentLayout()
+
+    def _buildGeometry(self):
+        ''' () -> tuple
+
+        Computes from the current styles and argument labels the border path,
+        name rect, total argument height, width, height, argument label
+        positions and the IO male, VF female and VF male start points (each
+        one may be None), on that order.
+        '''
         style_fc = VGS['styles']['block_function_call']
         style_notch = VGS['styles']['notch']
         npadd, c_size = style_fc['name_padding'], style_fc['corner_size']
@@ -173,12 +241,10 @@ class GxBlockFunctionCall(GxPluggableBlock):
         # half of the border width, for use as correction
         bw = style_fc['border_width']/2
 
-        self._name_font = QFont(style_fc['name_font_family'],
-                                style_fc['name_font_size'])
-        name_metrics = QFontMetricsF(self._name_font)
+        family, size = style_fc['name_font_family'], style_fc['name_font_size']
 
         # setting up nice short names for all the metrics
-        nw, nh = name_metrics.width(self._def['name']), name_metrics.height()
+        nw, nh = TEXT_METRICS.getTextSize(family, size, -1, self._def['name'])
         fvc = style_fc['name_vcorrection']
         hp, vp = npadd['horizontal'], npadd['vertical']
 #        bp = style_fc['bottom_padd']
@@ -203,14 +269,15 @@ class GxBlockFunctionCall(GxPluggableBlock):
             fvc += 1
 
         # updating the total argument height
-        self._args_height = 0
+        args_height = 0
         for arg in self._args_labels:
-            self._args_height += arg.getHeight()
+            args_height += arg.getHeight()
 
         if self._args_labels:
-            self._args_height += (len(self._args_labels) - 1) * \
+            args_height += (len(self._args_labels) - 1) * \
                 style_fc['arg_spacing']
 
+        io_male_start = vf_female_start = vf_male_start = None
         if self._def['return_type']:
             # height from the top up to the args y0
             args_y0 = max(vp, ch) + nh + vp
@@ -220,7 +287,7 @@ class GxBlockFunctionCall(GxPluggableBlock):
             #   - name width + horizontal padding (2*max(hp, cw) + nw)
             #   - minimum argument left padding + arg label width (maw)
             W = iow + max(2*max(hp, cw) + nw, maw, 50)
-            H = args_y0 + self._args_height + ch
+            H = args_y0 + args_height + ch
 
             path = GxPainterPath(QPointF(bw + iow, bw + ch))
             CornerPath.connect(path, corner_size, corner_shape, 'top-left')
@@ -228,20 +295,18 @@ class GxBlockFunctionCall(GxPluggableBlock):
             CornerPath.connect(path, corner_size, corner_shape, 'top-right')
             path.lineTo(path.x, args_y0)
 
-            self._placeArgs(path, iow, bw, W, asp)
+            args_pos = self._placeArgs(path, iow, bw, W, asp)
 
             CornerPath.connect(path, corner_size, corner_shape, 'bottom-right')
             path.lineTo(bw + iow + cw, path.y)
             CornerPath.connect(path, corner_size, corner_shape, 'bottom-left')
             path.lineTo(path.x, name_y0 + ioh + (nh - ioh)/2 + 2)
             NotchPath.connect(path, io_size, io_shape, '-j', 'left')
-            self.io_male_start = path.currentPosition()
+            io_male_start = path.currentPosition()
             path.closeSubpath()
 
-            self._name_rect = QRectF(bw + iow + hp, name_y0 + fvc,
-                                     W - 2*hp - iow, nh)
-            self.vf_female_start = None
-            self.vf_male_start = None
+            name_rect = QRectF(bw + iow + hp, name_y0 + fvc,
+                               W - 2*hp - iow, nh)
         else:
             # height from the top up to the args y0
             args_y0 = vfh + 2*vp + nh
@@ -251,52 +316,46 @@ class GxBlockFunctionCall(GxPluggableBlock):
             #   - vf notch x0 + vf notch width (vfs + vfw)
             #   - minimum argument left padding + arg label width (maw)
             W = max(2*max(hp, cw) + nw, vfs + vfw + cw + 10, maw)
-            H = args_y0 + self._args_height + ch + vfh
+            H = args_y0 + args_height + ch + vfh
 
             path = GxPainterPath(QPointF(bw, bw + ch))
             CornerPath.connect(path, corner_size, corner_shape, 'top-left')
             path.lineToInc(dx = vfs - cw)
-            self.vf_female_start = path.currentPosition()
+            vf_female_start = path.currentPosition()
             NotchPath.connect(path, vf_size, vf_shape, '+i', 'down')
             path.lineTo(W - cw, path.y)
             CornerPath.connect(path, corner_size, corner_shape, 'top-right')
             path.lineTo(path.x, args_y0)
 
-            self._placeArgs(path, iow, bw, W, asp)
+            args_pos = self._placeArgs(path, iow, bw, W, asp)
 
             CornerPath.connect(path, corner_size, corner_shape, 'bottom-right')
             path.lineToInc(dx = -W + vfs + cw + vfw)
             NotchPath.connect(path, vf_size, vf_shape, '-i', 'down')
-            self.vf_male_start = path.currentPosition()
+            vf_male_start = path.currentPosition()
             path.lineTo(bw + cw, path.y)
             CornerPath.connect(path, corner_size, corner_shape, 'bottom-left')
             path.closeSubpath()
 
-            self._name_rect = QRectF(bw + hp, args_y0 - vp - nh + fvc,
-                                     W - 2*hp, nh)
-            self.io_male_start = None
+            name_rect = QRectF(bw + hp, args_y0 - vp - nh + fvc,
+                               W - 2*hp, nh)
 
-        self._border_path = path
-        self._width, self._height = W + bw, H + bw
-
-#        print('Updating connectors GxBlockFunctionCall ', self._name)
-        self.updateConnections()
-        self.update(self.boundingRect())
-
-        if isinstance(self.parentItem(), GxBlock):
-            self.parentItem().updateMetrics()
+        return (path, name_rect, args_height, W + bw, H + bw,
+                args_pos, io_male_start, vf_female_start, vf_male_start)
 
     def _placeArgs(self, path, iow, bw, W, asp):
-        ''' (GxPainterPath, number, number, number, number) -> NoneType
+        ''' (GxPainterPath, number, number, number, number) -> list of QPointF
 
-        From the current position on the path, set the GxArgLabel objects
-        final positions.
+        From the current position on the path, computes the GxArgLabel
+        objects final positions (on the order of self._args_labels).
         '''
+        positions = []
         for arg in self._args_labels:
-            arg.setPos(W - arg.getWidth() - bw, path.y - bw)
+            positions.append(QPointF(W - arg.getWidth() - bw, path.y - bw))
             path.lineToInc(dx = -iow - 3*bw)
             path.lineToInc(dy = arg.getHeight())
             path.lineToInc(dx = iow + 3*bw)
+        return positions
 
     def updateDefinition(self, **kwargs):
         ''' (kwargs) -> NoneType
@@ -309,7 +368,12 @@ class GxBlockFunctionCall(GxPluggableBlock):
                 if x == 'args':
                     self.setupArgLabels()
         self.updateMetrics()
-    
+
+trace_register(GxBlockFunctionCall, ('updateMetrics', 'paint'), 'gx')
+
+STYLES.subscribe(['block_function_call', 'notch'],
+                 lambda section, key: GxBlockFunctionCall.relayoutAll())
+
 
 class WinCustomizeFunctionCall(QMainWindow):
     def __init__(self, parent=None):
@@ -359,25 +423,26 @@ class WinCustomizeFunctionCall(QMainWindow):
         # UI name convention:
         #   widget kind + '_' + tab identifier + '_' + style attribute        
 
-        sfc = VGS['styles']['block_function_call']
-        sa = VGS['styles']['block_arg_label']
-        sn = VGS['styles']['notch']        
+        sfc, sa, sn = 'block_function_call', 'block_arg_label', 'notch'
 
-        s_tabs = {'fc': sfc, 'arg': sa, 'nch': sn, 'fcnp': sfc['name_padding'],
-                  'fccs': sfc['corner_size'], 'argpd': sa['padding'],
-                  'argcs': sa['corner_size'], 'vfsz': sn['vf_size'],
-                  'iosz': sn['io_size']}
+        # tab identifier -> (style section, key prefix on the section)
+        s_tabs = {'fc': (sfc, ''), 'arg': (sa, ''), 'nch': (sn, ''),
+                  'fcnp': (sfc, 'name_padding.'),
+                  'fccs': (sfc, 'corner_size.'), 'argpd': (sa, 'padding.'),
+                  'argcs': (sa, 'corner_size.'), 'vfsz': (sn, 'vf_size.'),
+                  'iosz': (sn, 'io_size.')}
                   
         for name, wg in self.ui.__dict__.items():
             suffix = name[name.find('_')+1:]
             tab_prefix = suffix[:suffix.find('_')]
             attr = suffix[suffix.find('_')+1:]
+            section, key_prefix = s_tabs[tab_prefix]
             
             if isinstance(wg, (QSpinBox, QComboBox, QSlider)):
-                self._setupSignal(wg, s_tabs[tab_prefix], attr)
+                self._setupSignal(wg, section, key_prefix + attr)
             elif isinstance(wg, QFrame) and not isinstance(wg, QLabel):
                 # those QFrame are for color selection
-                self._setupFrameClick(wg, s_tabs[tab_prefix], attr)                  
+                self._setupFrameClick(wg, section, key_prefix + attr)
 
     def _updateFunctionArgs(self, text):
         self.args, text = [], str(text)
@@ -386,59 +451,67 @@ class WinCustomizeFunctionCall(QMainWindow):
                 self.args.append({'name': x, 'type': 'int', 'restriction': None})
         self.block_function_call.updateDefinition(args=self.args)
 
-    def _updateStyle(self, style, attr, value):
-        style[attr] = value
-        self.block_function_call.setupArgLabels()
-        self.block_function_call.updateMetrics()
+    def _updateStyle(self, section, attr, value):
+        ''' (str, str, object) -> NoneType
+
+        The blocks affected get relaid out by the style subscriptions.
+        '''
+        STYLES.set(section, attr, value)
 
-    def _setupSignal(self, sender, style, attr):
-        ''' (QSpinBox/QComboBox/QSlider, str) -> NoneType
+    def _setupSignal(self, sender, section, attr):
+        ''' (QSpinBox/QComboBox/QSlider, str, str) -> NoneType
 
-        Configures on the sender widget the current value of 'attr' in 'style',
-        and also setup its suitable signal to customization changes.
+        Configures on the sender widget the current value of 'attr' in the
+        style 'section', and also setup its suitable signal to customization
+        changes.
         '''
-        if attr not in style:
+        try:
+            value = STYLES.get(section, attr)
+        except KeyError:
             return
             
         if isinstance(sender, QSpinBox):
-            sender.setValue(style.get(attr, 0))
+            sender.setValue(value)
             sender.valueChanged[int].connect(
-                lambda: self._updateStyle(style, attr, sender.value()))
+                lambda: self._updateStyle(section, attr, sender.value()))
 
         elif isinstance(sender, QComboBox):
-            sender.setCurrentIndex(sender.findText(style.get(attr, '')))
+            sender.setCurrentIndex(sender.findText(value))
             sender.currentIndexChanged[int].connect(
-                lambda: self._updateStyle(style, attr,
+                lambda: self._updateStyle(section, attr,
                                            str(sender.currentText())))
 
         elif isinstance(sender, QSlider):
             if attr == 'vf_x0':
-                sender.setValue(style.get(attr, 0))
+                sender.setValue(value)
                 sender.valueChanged[int].connect(
-                    lambda: self._updateStyle(style, attr,
+                    lambda: self._updateStyle(section, attr,
                                               float(sender.value())))
             else:
-                sender.setValue(style.get(attr, 0)*100)
+                sender.setValue(value*100)
                 sender.valueChanged[int].connect(
-                    lambda: self._updateStyle(style, attr,
+                    lambda: self._updateStyle(section, attr,
                                               float(sender.value()/100)))
 
-    def _setupFrameClick(self, frame, style, attr):
-        ''' (QFrame, str) -> NoneType
+    def _setupFrameClick(self, frame, section, attr):
+        ''' (QFrame, str, str) -> NoneType
 
         Configures the frame background color to the current color of
-        'attr' in 'style', and also enable its mousePressEvent to execute
-        a color dialog.
+        'attr' in the style 'section', and also enable its mousePressEvent
+        to execute a color dialog.
         '''
+        try:
+            current_color = QColor(STYLES.get(section, attr))
+        except KeyError:
+            current_color = QColor('white')
         palette = frame.palette()
-        current_color = QColor(style.get(attr, 'white'))
         palette.setColor(QPalette.Background, current_color)
         frame.setPalette(palette)
         frame.mousePressEvent = \
-            lambda event: self._chooseColor(frame, style, attr)
+            lambda event: self._chooseColor(frame, section, attr)
 
-    def _chooseColor(self, frame, style, attr):
-        ''' (QFrame, Style, str) -> NoneType
+    def _chooseColor(self, frame, section, attr):
+        ''' (QFrame, str, str) -> NoneType
 
         Saves the current color as 'old_color', then launch the color dialog.
         Changes on the dialog are reflected immediately on the GxArgLabel.
@@ -449,7 +522,7 @@ class WinCustomizeFunctionCall(QMainWindow):
         color_dialog = QColorDialog(old_color)
 
         color_dialog.currentColorChanged[QColor].connect(
-            lambda: self._updateStyle(style, attr,
+            lambda: self._updateStyle(section, attr,
                     str(color_dialog.currentColor().name())))
 
         answer = color_dialog.exec_()
@@ -457,10 +530,9 @@ class WinCustomizeFunctionCall(QMainWindow):
             new_color = color_dialog.currentColor()
             palette.setColor(QPalette.Background, new_color)
             frame.setPalette(palette)
-            self._updateStyle(style, attr, str(new_color.name()))
+            self._updateStyle(section, attr, str(new_color.name()))
         else:
-            self._updateStyle(style, attr, str(old_color.name()))
-
+            self._updateStyle(section, attr, str(old_color.name()))
 
 def main():
     app = QApplication(sys.argv)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Chooses the cache mode of the blocks of a scene, keeping the
+#              memory spent on item caches under a budget.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Item caches of the Graphics View framework are pixmaps kept on the global
+``QPixmapCache``. They pay off for blocks that are painted often without
+changing (scrolling, dragging), but not for:
+
+    * blocks that change all the time, since the cache is thrown away on
+      every ``update()`` and the block is painted twice (pixmap + screen);
+    * blocks drawn with low detail (see ``GxBlock.getLodTier()``), which
+      are cheaper to paint than to blit;
+    * huge blocks (at the current zoom), which would hog the budget.
+
+``GxCachePolicy`` looks at the blocks of a scene from time to time and picks
+their cache mode accordingly. When the estimated size of the caches exceeds
+the budget, the caches of the blocks that have been off-screen for longer
+are dropped first. They are brought back once the blocks are seen again.
+"""
+from __future__ import division, print_function
+from timeit import default_timer
+
+from PyQt4.QtGui import *
+from PyQt4.QtCore import *
+
+from visuino.gx.bases import GxBlock
+from visuino.settings import VGS
+
+__all__ = ['GxCachePolicy']
+
+class GxCachePolicy(QObject):
+    '''
+    Cache mode manager of the blocks (``GxBlock``) of one scene.
+
+    :ivar budget_kb: ``int``.
+        Memory (KB) allowed for the caches of the blocks. Also given to
+        ``QPixmapCache.setCacheLimit()`` (see ``self.setBudget()``).
+    :ivar _scene: ``GxSceneBlocks``.
+    :ivar _timer: ``QTimer``. Triggers ``self.refresh()``.
+    '''
+    #: Interval (ms) between two evaluations of the blocks
+    CHECK_INTERVAL = 1000
+
+    #: Default budget (KB), when not given by VGS['performance']
+    DEFAULT_BUDGET_KB = 32768
+
+    #: A single block never gets more than this fraction of the budget
+    MAX_ITEM_FRACTION = 1/16
+
+    #: Cached blocks painted more than this many times per second (i.e. the
+    #: cache is being invalidated) lose the cache for RETRY_DELAY seconds
+    MAX_REPAINT_RATE = 4.0
+    RETRY_DELAY = 10.0
+
+    def __init__(self, scene):
+        '''
+        :param scene: ``GxSceneBlocks``. Also the QObject parent.
+        '''
+        QObject.__init__(self, scene)
+        self._scene = scene
+        self.budget_kb = 0
+        self.setBudget(VGS.get('performance', {}).get(
+            'pixmap_cache_kb', self.DEFAULT_BUDGET_KB))
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.CHECK_INTERVAL)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start()
+        self._last_check = default_timer()
+        self._last_zoom = self.getZoom()
+
+    def setBudget(self, budget_kb):
+        '''
+        :param budget_kb: ``int``. Memory (KB) for the item caches. The
+            ``QPixmapCache`` limit is never lowered by this (it is shared
+            by the whole application).
+        '''
+        self.budget_kb = int(budget_kb)
+        if QPixmapCache.cacheLimit() < self.budget_kb:
+            QPixmapCache.setCacheLimit(self.budget_kb)
+
+    def getZoom(self):
+        '''
+        :return: ``float`` - Largest scale among the views of the scene.
+        '''
+        return max([v.transform().m11() for v in self._scene.views()] or [1])
+
+    def getCacheCost(self, block, mode=QGraphicsItem.DeviceCoordinateCache,
+                     zoom=None):
+        '''
+        :return: ``float`` - Estimated size (KB) of the cache of 'block' on
+                 the given mode (device caches are kept per view).
+        '''
+        if mode == QGraphicsItem.NoCache:
+            return 0
+        rect = block.boundingRect()
+        kb = rect.width() * rect.height() * 4 / 1024
+        if mode == QGraphicsItem.DeviceCoordinateCache:
+            zoom = self.getZoom() if zoom is None else zoom
+            kb *= zoom * zoom * max(len(self._scene.views()), 1)
+        return kb
+
+    def chooseCacheMode(self, block, zoom=None):
+        '''
+        :param block: ``GxBlock``.
+        :param zoom: ``float`` <None>. Defaults to ``self.getZoom()``.
+        :return: ``QGraphicsItem.CacheMode``
+        '''
+        zoom = self.getZoom() if zoom is None else zoom
+        thresholds = block.getLodThresholds()
+        if thresholds and zoom < thresholds[-1][0]:
+            # below the full detail tier
+            return QGraphicsItem.NoCache
+        if self.getCacheCost(block, QGraphicsItem.DeviceCoordinateCache,
+                zoom) > self.budget_kb * self.MAX_ITEM_FRACTION:
+            return QGraphicsItem.NoCache
+        return QGraphicsItem.DeviceCoordinateCache
+
+    def apply(self, block):
+        '''
+        Sets the cache mode chosen for 'block' right away. Meant for new
+        blocks; the others are handled by ``self.refresh()``.
+        '''
+        block.setCacheMode(self.chooseCacheMode(block))
+        block._cache_seen = default_timer()
+        block._cache_evicted = False
+
+    def refresh(self):
+        '''
+        Chooses again the cache mode of all the blocks of the scene and, if
+        needed, drops the caches of the blocks off-screen for longer.
+        '''
+        now = default_timer()
+        elapsed, self._last_check = now - self._last_check, now
+        zoom = self.getZoom()
+        # zooming invalidates the device caches, so it can not be told
+        # apart from repaints due to changes of the blocks
+        measure = elapsed > 0 and zoom == self._last_zoom
+        self._last_zoom = zoom
+
+        visible = set()
+        for view in self._scene.views():
+            rect = view.mapToScene(view.viewport().rect()).boundingRect()
+            visible.update(self._scene.items(rect))
+
+        total, offscreen = 0, []
+        for item in self._scene.items():
+            if not isinstance(item, GxBlock) or not item.isVisible():
+                continue
+            if item in visible or not hasattr(item, '_cache_seen'):
+                item._cache_seen = now
+                item._cache_evicted = False
+            elif item._cache_evicted:
+                # stays without cache until it gets visible again
+                item._cache_paints = item.paint_count
+                continue
+
+            # without cache, paints are due to exposure and say nothing
+            paints = item.paint_count - getattr(item, '_cache_paints',
+                                                item.paint_count)
+            item._cache_paints = item.paint_count
+            if (measure and item.cacheMode() != QGraphicsItem.NoCache and
+                    paints / elapsed > self.MAX_REPAINT_RATE):
+                item._cache_retry = now + self.RETRY_DELAY
+
+            if now < getattr(item, '_cache_retry', 0):
+                mode = QGraphicsItem.NoCache
+            else:
+                mode = self.chooseCacheMode(item, zoom)
+            if item.cacheMode() != mode:
+                item.setCacheMode(mode)
+            if mode != QGraphicsItem.NoCache:
+                total += self.getCacheCost(item, mode, zoom)
+                if item not in visible:
+                    offscreen.append(item)
+
+        # evicting the ones that have been off-screen for longer
+        offscreen.sort(key=lambda x: x._cache_seen)
+        for item in offscreen:
+            if total <= self.budget_kb:
+                break
+            total -= self.getCacheCost(item, item.cacheMode(), zoom)
+            item.setCacheMode(QGraphicsItem.NoCache)
+            item._cache_evicted = True
+            # paints due to the eviction must not count as repaints
+            item._cache_paints = item.paint_count
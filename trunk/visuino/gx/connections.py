@@ -19,6 +19,9 @@ from PyQt4.QtCore import *
 from visuino.gx.bases import GxBlock
 from visuino.gx.shapes import *
 from visuino.gx.utils import *
+from visuino.gx.hud import FRAME_STATS
+from visuino.core.lib_defs import types_compatible
+from visuino.utils import trace_register
 
 from visuino.settings import VGS
 
@@ -60,8 +63,15 @@ class GxColliPath(QGraphicsPathItem):
         colli_set = self.kind + '_' + self.gender_ext + '_colli_paths'
         if hasattr(self.scene(), colli_set):
             getattr(self.scene(), colli_set).add(self)
+            self.scene().colli_paths_version += 1
 #            print('Created colli path on self.scene.', colli_set, sep='')
 
+        # free female IO slots are also indexed by the type they accept
+        if self.kind == 'io' and self.isFemale() and \
+           hasattr(self.scene(), 'registerIoSlot') and \
+           getattr(parent, 'child_io', None) is None:
+            self.scene().registerIoSlot(self, parent.getArgType())
+
     @property
     def kind(self):
         return self._kind.lower()
@@ -96,10 +106,16 @@ class GxColliPath(QGraphicsPathItem):
         of its reference on whatever set of colli path it is in.
         '''
         scene = self.scene()
+        if scene is None:
+            return
         colli_set = self.kind + '_' + self.gender_ext + '_colli_paths'
         if hasattr(scene, colli_set) and self in getattr(scene, colli_set):
             getattr(scene, colli_set).remove(self)
+            scene.colli_paths_version += 1
 #            print('Removed ', self, ' from ', colli_set, sep='')        
+        if self.kind == 'io' and self.isFemale() and \
+           hasattr(scene, 'unregisterIoSlot'):
+            scene.unregisterIoSlot(self)
         scene.removeItem(self)
 
 
@@ -107,12 +123,23 @@ class GxInsertionMarker(QGraphicsPathItem):
     '''
     Insertion marker meant to be shown when of the collision male/female
     IO notches.
+
+    Markers are meant to be recycled: use GxInsertionMarker.acquire() to get
+    one placed on some start point and release() to hand it back to the
+    scene pool (see GxSceneBlocks.insertion_markers_pool), where it waits
+    hidden for the next collision instead of being removed from the scene.
+    While idle on the pool, a marker has an empty bounding rect, so it does
+    not count on the items bounding rect of the scene (see
+    GxSceneBlocks.updateSceneRect()).
     '''
-    def __init__(self, kind, start_point, scene):
-        ''' ('io'/'vf', QPointF, GxSceneBlocks)
+    def __init__(self, kind, start_point, scene, idle=False):
+        ''' ('io'/'vf', QPointF, GxSceneBlocks, bool)
+
+        An 'idle' marker is created hidden, for the scene pool, and is
+        neither placed nor brought to the front.
         '''
         sn = VGS['styles']['notch']
-        x0, y0 = start_point.x(), start_point.y()
+        self._kind = kind
         self._pen = QPen(QColor(sn['insertion_marker_color']),
                          sn['insertion_marker_width'],
                          Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
@@ -130,7 +157,7 @@ class GxInsertionMarker(QGraphicsPathItem):
             path.lineToInc(dy = DY)
 
             W, H = iow + 2*pw, 2*DY + ioh + 2*pw
-            pos = QPointF(x0 - iow - pw, y0 - ((H - ioh)/2))
+            self._dx, self._dy = - iow - pw, - ((H - ioh)/2)
         else:
             vfw, vfh = sn['vf_size']['width'], sn['vf_size']['height']
             DX = vfw/2
@@ -143,18 +170,99 @@ class GxInsertionMarker(QGraphicsPathItem):
             path.lineToInc(dx = DX)
 
             W, H = 2*DX + vfw + 2*pw, vfh + 2*pw
-            pos = QPointF(x0 - ((W - vfw)/2), y0 - vfh - pw)
+            self._dx, self._dy = - ((W - vfw)/2), - vfh - pw
 
         self._width, self._height = W, H
+        self._idle = idle
 
         QGraphicsPathItem.__init__(self, path, None, scene)
         self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
-        scene.bringToFront(self)
-        self.setPos(pos)
+        if idle:
+            self.setVisible(False)
+        else:
+            scene.bringToFront(self)
+            self.setStartPoint(start_point)
+
+    @property
+    def kind(self):
+        return self._kind
+
+    @staticmethod
+    def acquire(kind, start_point, scene):
+        ''' ('io'/'vf', QPointF, GxSceneBlocks) -> GxInsertionMarker
+
+        Returns a marker of the given kind placed on 'start_point' and
+        brought to the front. A hidden marker from the scene pool is reused
+        whenever there is one; a new one is created otherwise.
+        '''
+        pool = getattr(scene, 'insertion_markers_pool', None)
+        if pool and pool.get(kind):
+            marker = pool[kind].pop()
+            marker._setIdle(False)
+            marker.setStartPoint(start_point)
+            scene.bringToFront(marker)
+            return marker
+        return GxInsertionMarker(kind, start_point, scene)
+
+    @staticmethod
+    def fillPool(scene):
+        ''' (GxSceneBlocks) -> NoneType
+
+        Prebuilds idle markers of each kind until the scene pool is full, so
+        that no marker needs to be created while some drag is going on.
+        '''
+        pool = getattr(scene, 'insertion_markers_pool', None)
+        if pool is None:
+            return
+        for kind in ('io', 'vf'):
+            markers = pool.setdefault(kind, [])
+            while len(markers) < scene.INSERTION_MARKERS_POOL_SIZE:
+                markers.append(GxInsertionMarker(kind, QPointF(0, 0), scene,
+                                                 idle=True))
+
+    def release(self):
+        ''' () -> NoneType
+
+        Hides the marker and gives it back to the scene pool. If the scene
+        has no pool (or it is already full) the marker is removed instead.
+        '''
+        scene = self.scene()
+        if scene is None or self._idle:
+            return
+        pool = getattr(scene, 'insertion_markers_pool', None)
+        if pool is not None and \
+           len(pool.setdefault(self._kind, [])) < \
+           scene.INSERTION_MARKERS_POOL_SIZE:
+            self._setIdle(True)
+            pool[self._kind].append(self)
+        else:
+            scene.removeItem(self)
+
+    def _setIdle(self, idle):
+        ''' (bool) -> NoneType
+
+        Idle markers are hidden and have an empty bounding rect.
+        '''
+        self.prepareGeometryChange()
+        self._idle = idle
+        self.setVisible(not idle)
+
+    def setStartPoint(self, start_point):
+        ''' (QPointF) -> NoneType
+
+        Places the marker over the notch that starts on the given point
+        (scene coordinates).
+        '''
+        self.setPos(start_point.x() + self._dx, start_point.y() + self._dy)
 
     def boundingRect(self):
         ''' QGraphicsItem.boundingRect() -> QRectF
+
+        Empty while idle on the scene pool (a null rect is ignored by the
+        items bounding rect of the scene).
         '''
+        if self._idle:
+            return QRectF()
         return QRectF(0, 0, self._width, self._height)
 
     def paint(self, painter, option=None, widget=None):
@@ -216,6 +324,19 @@ class GxPluggableBlock(GxBlock):
         self.child_vf = None
         
         self.bottom_child_vf = None
+
+        # blocks (of the stack being dragged) whose colli paths were taken
+        # out of the scene until the drop - see self.beginStackMove()
+        self._stack_moving = False
+        self._colli_suspended = False
+        self._suspended_blocks = []
+
+        # colli paths this block may snap onto while being dragged (None when
+        # not dragging) and the scene colli_paths_version they were computed
+        # on - see self._updateSnapCandidates()
+        self._io_snap_candidates = None
+        self._vf_snap_candidates = None
+        self._snap_version = None
         
         self._element = None
         self.snippet_id = None
@@ -228,6 +349,24 @@ class GxPluggableBlock(GxBlock):
         """
         return self._element
 
+    def getIoType(self):
+        ''' () -> str <None>
+
+        *TO BE RE-IMPLEMENTED* by blocks with an IO male notch. Type of
+        the value given by this block (the 'return_type' on the library
+        definitions), used to check where it can be plugged.
+        '''
+        return None
+
+    def getArgType(self):
+        ''' () -> str <None>
+
+        *TO BE RE-IMPLEMENTED* by blocks with an IO female notch. Type of
+        the value accepted by this block (the arg 'type' on the library
+        definitions), used to check what can be plugged on it.
+        '''
+        return None
+
     def updateMySnippet(self):
         '''
         '''
@@ -257,11 +396,19 @@ class GxPluggableBlock(GxBlock):
         IO female. Therefore, connections by dragging IO female to some IO
         male have no effect.
         '''
+        if not self._stack_moving:
+            self.beginStackMove()
+        elif self._snap_version != getattr(self.scene(),
+                                           'colli_paths_version', None):
+            # colli paths were rebuilt meanwhile (e.g. by a deferred layout)
+            self._updateSnapCandidates()
+
         if self.io_male_colli_path and not self.parent_io:
             colli = self.io_male_colliding
             if not colli:
                 # checks for collision with FEMALE IO colli paths
-                for x in self.scene().io_female_colli_paths:
+                for x in self._io_snap_candidates:
+                    FRAME_STATS.collision_tests += 1
                     if self.io_male_colli_path.collidesWithItem(x):
 #                        print('IO Collision detected!')
                         self._startInsertionEffect('io', 'M', x)
@@ -273,7 +420,8 @@ class GxPluggableBlock(GxBlock):
             colli = self.vf_female_colliding
             if not colli:
                 # checks for collision with MALE VF colli paths
-                for x in self.scene().vf_male_colli_paths:
+                for x in self._vf_snap_candidates:
+                    FRAME_STATS.collision_tests += 1
                     if self.vf_female_colli_path.collidesWithItem(x):
 #                        print('VF female->male collision detected!')
                         self._startInsertionEffect('vf', 'F', x)
@@ -302,7 +450,8 @@ class GxPluggableBlock(GxBlock):
 #            print('Creating insertion maker...')        
             setattr(self, kind + '_' + gender + '_colliding', target)      
             setattr(self, kind + '_' + gender + '_insertion_marker',
-                GxInsertionMarker(kind, target.getStartPoint(), self.scene()))
+                GxInsertionMarker.acquire(kind, target.getStartPoint(),
+                                          self.scene()))
 
     def _endInsertionEffect(self, kind, source_gender):
         ''' ('io'/'vf', 'F'/'M')
@@ -311,7 +460,7 @@ class GxPluggableBlock(GxBlock):
         i_mark = getattr(self, kind + '_' + gender + '_insertion_marker')
         if i_mark:
 #            print('Removing ', kind, ' ', source_gender, ' insertion marker...' , sep='')
-            self.scene().removeItem(i_mark)
+            i_mark.release()
             setattr(self, kind + '_' + gender + '_insertion_marker', None)
             setattr(self, kind + '_' + gender + '_colliding', None)
 
@@ -329,7 +478,7 @@ class GxPluggableBlock(GxBlock):
         for notch in ('io_male', 'vf_male', 'vf_female'):
             im = getattr(self, notch + '_insertion_marker')
             if im is not None:
-                self.scene().removeItem(im)
+                im.release()
             setattr(self, notch + '_insertion_marker', None)
 
     def plugIo(self, target, update_snippet=True):
@@ -386,7 +535,7 @@ class GxPluggableBlock(GxBlock):
             target.child_vf = self
     
             self.setParentItem(target)
-            self._updateChildVfPosition(target)
+            target.updateVfStackPositions()
             
         else:
             my_bottom_child = self.getBottomChildVf()
@@ -398,9 +547,8 @@ class GxPluggableBlock(GxBlock):
             self.parent_vf = target
 
             self.setParentItem(target)
-            self._updateChildVfPosition(target)            
             new_child.setParentItem(my_bottom_child)
-            self._updateChildVfPosition(my_bottom_child) 
+            target.updateVfStackPositions()
 
         if update_snippet:
             self.getTopParentVf().updateMySnippet()
@@ -440,6 +588,18 @@ class GxPluggableBlock(GxBlock):
             if update_snippet:
                 old_top_parent.updateMySnippet()
             
+    def getVfChain(self):
+        ''' () -> list of GxPluggableBlock
+
+        Returns this block followed by all its VF childs, from the top to
+        the bottom of the stack.
+        '''
+        chain, block = [self], self.child_vf
+        while block:
+            chain.append(block)
+            block = block.child_vf
+        return chain
+
     def getBottomChildVf(self):
         if not self.child_vf:
             return self
@@ -485,6 +645,134 @@ class GxPluggableBlock(GxBlock):
             y -= parent.getBorderWidth()/2
             parent.child_vf.setPos(x, y)
 
+    def updateVfStackPositions(self):
+        ''' () -> NoneType
+
+        Shifts the whole VF chain below this block on a single pass. Since
+        each child VF is a child item of the block above it, only the childs
+        that are actually out of place get a new position, and every other
+        block of the stack just follows along - so the stack goes through one
+        geometry update and its region is repainted only once.
+        '''
+        for block in self.getVfChain()[:-1]:
+            child = block.child_vf
+            new_pos = QPointF(0, block.vf_male_start.y() - 
+                                 block.getBorderWidth()/2)
+            if child.pos() != new_pos:
+                child.setPos(new_pos)
+
+    def _suspendColliPaths(self, keep=()):
+        ''' (tuple of str in self.NOTCHES) -> NoneType
+
+        Takes the colli paths of this block out of the scene (and out of the
+        scene colli path sets), except for the notches given in 'keep'. They
+        are rebuilt by self._resumeColliPaths().
+        '''
+        for notch in self.NOTCHES:
+            colli = getattr(self, notch + '_colli_path')
+            if notch not in keep and isinstance(colli, GxColliPath):
+                colli.removeFromScene()
+                setattr(self, notch + '_colli_path', None)
+        self._colli_suspended = True
+
+    def _resumeColliPaths(self):
+        ''' () -> NoneType
+        '''
+        self._colli_suspended = False
+        self.updateConnections()
+
+    def _updateSnapCandidates(self):
+        ''' () -> NoneType
+
+        Computes the colli paths this block may snap onto: female IO slots
+        that are free and whose arg type accepts the type of this block, and
+        male VF notches. Notches of the stack being dragged are never
+        candidates. Done when the drag starts, and again whenever the colli
+        paths of the scene change during the drag (see the scene
+        ``colli_paths_version``); a target that left the scene meanwhile
+        loses its insertion marker. The number of candidates is reported on
+        the scene ``snap_candidates_count`` attribute.
+        '''
+        scene = self.scene()
+        io_type = self.getIoType()
+
+        if self.io_male_colliding and self.io_male_colliding.scene() is None:
+            self._endInsertionEffect('io', 'M')
+        if self.vf_female_colliding and \
+           self.vf_female_colliding.scene() is None:
+            self._endInsertionEffect('vf', 'F')
+
+        self._io_snap_candidates = []
+        if self.io_male_colli_path:
+            if hasattr(scene, 'getFreeIoSlots'):
+                # the scene already keeps the free slots indexed by type
+                self._io_snap_candidates = [x for x in 
+                    scene.getFreeIoSlots(io_type) if not self.isAncestorOf(x)]
+            else:
+                for x in scene.io_female_colli_paths:
+                    slot = x.parentItem()
+                    if slot.child_io is None and not self.isAncestorOf(x) \
+                       and types_compatible(slot.getArgType(), io_type):
+                        self._io_snap_candidates.append(x)
+
+        self._vf_snap_candidates = []
+        if self.vf_female_colli_path:
+            self._vf_snap_candidates = [x for x in scene.vf_male_colli_paths
+                                        if not self.isAncestorOf(x)]
+
+        scene.snap_candidates_count = len(self._io_snap_candidates) + \
+                                      len(self._vf_snap_candidates)
+        self._snap_version = getattr(scene, 'colli_paths_version', None)
+
+    def beginStackMove(self):
+        ''' () -> NoneType
+
+        Should be called when this block starts being dragged. The colli
+        paths of the whole moving stack (VF childs, arg labels and plugged IO
+        blocks) are taken out of the scene, so the scene index does not need
+        to reposition them on every move event and the stack can never be
+        detected as a target of itself. Only the notches that drive the
+        dragging (IO male and VF female of this block) are kept. The paths
+        are rebuilt on the drop, by self.endStackMove().
+
+        The snap candidates for the whole drag are also computed here.
+        Calling it again before self.endStackMove() does nothing.
+        '''
+        if self._stack_moving:
+            return
+        self._stack_moving = True
+        GxInsertionMarker.fillPool(self.scene())
+
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            stack.extend(x for x in item.childItems() 
+                         if isinstance(x, GxPluggableBlock))
+            if item is self:
+                item._suspendColliPaths(keep=('io_male', 'vf_female'))
+            else:
+                item._suspendColliPaths()
+            self._suspended_blocks.append(item)
+
+        self._updateSnapCandidates()
+
+    def endStackMove(self):
+        ''' () -> NoneType
+
+        Rebuilds the colli paths taken out by self.beginStackMove() and
+        forgets the snap candidates of the drag.
+        '''
+        self._stack_moving = False
+        self._io_snap_candidates = None
+        self._vf_snap_candidates = None
+        self._snap_version = None
+        for block in self._suspended_blocks:
+            if block.scene():
+                block._resumeColliPaths()
+            else:
+                block._colli_suspended = False
+        self._suspended_blocks = []
+
     def updateConnections(self):
         ''' () -> NoneType
 
@@ -493,13 +781,32 @@ class GxPluggableBlock(GxBlock):
         consider their current start point attribute. So, if you wanna
         remove a connection on some notch, set its start point to None,
         an than call this method.
+
+        While the block is part of a stack being dragged, the colli paths
+        are not rebuilt until the drop (see self.beginStackMove()).
         '''
-        self._cleanColliPaths()
-        for x in self.NOTCHES:
-            self._updateNotch(x)
+        if not self._colli_suspended:
+            self._cleanColliPaths()
+            for x in self.NOTCHES:
+                self._updateNotch(x)
 
         self._updateChildVfPosition(self)
 
+    def sceneEvent(self, event):
+        ''' QGraphicsItem.sceneEvent(QEvent) -> bool
+
+        The mouse grab may be lost without a left button release (e.g. by
+        another button release, a popup or the block getting hidden), so a
+        drag still going on is finished when the grab goes away: the
+        insertion markers are released and the colli paths of the stack
+        are rebuilt.
+        '''
+        if event.type() == QEvent.UngrabMouse and self._stack_moving:
+            self._endInsertionEffect('io', 'M')
+            self._endInsertionEffect('vf', 'F')
+            self.endStackMove()
+        return GxBlock.sceneEvent(self, event)
+
     def mousePressEvent(self, event):
         ''' GxBlock.mousePressEvent(QGraphicsSceneMouseEvent) -> NoneType
         '''           
@@ -525,9 +832,11 @@ class GxPluggableBlock(GxBlock):
                     last_sel_child.unplugVf()
                     if parent:
                         last_sel_child.plugVfFemale(parent)
-                self._checkNotchCollisions() 
+
+            # from now on, only the dragged stack moves
+            self.beginStackMove()
             
-            if self.io_male_start:
+            if self.isSelected() or self.io_male_start:
                 self._checkNotchCollisions()                      
             
     def mouseMoveEvent(self, event):
@@ -542,7 +851,11 @@ class GxPluggableBlock(GxBlock):
         ''' GxBlock.mouseReleaseEvent(QGraphicsSceneMouseEvent) -> NoneType
         '''                
         GxBlock.mouseReleaseEvent(self, event)
-        if not self.mouse_active or not self.scene(): return
+        if not self.mouse_active: return
+        if not self.scene():
+            # dropped on the palette (removed from the scene)
+            self.endStackMove()
+            return
         
         if event.button() == Qt.LeftButton:
         
@@ -555,6 +868,8 @@ class GxPluggableBlock(GxBlock):
             if self.vf_female_colliding and not self.parent_vf:
                 self.plugVfFemale(self.vf_female_colliding.parentItem())
                 self._endInsertionEffect('vf', 'F')  
+
+            self.endStackMove()
                 
     #        if self.vf_male_colliding:
     #            self.plugVfMale(self.vf_male_colliding.parentItem())
@@ -578,4 +893,7 @@ class GxPluggableBlock(GxBlock):
             self.sketch.removeSnippet(self.snippet_id)
             
         self._cleanInsertionMarkers()
-        GxBlock.removeFromScene(self)
\ No newline at end of file
+        GxBlock.removeFromScene(self)
+
+trace_register(GxPluggableBlock, ('_checkNotchCollisions', 'plugIo',
+                                  'plugVfFemale'), 'gx')
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Frame-time statistics and the heads-up display (HUD) used by
+#              GxView to show them over the scene.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+The hot paths of the blocks (painting, collision tests, metrics updates)
+increment the counters of ``FRAME_STATS`` all the time - they are simple
+integer attributes, so it costs next to nothing. Those are running totals,
+shared by all the views; each ``GxView`` showing the HUD keeps its own
+``FrameStats`` and, every time it finishes painting a frame, saves there the
+part of the totals that belongs to that frame. The saved values are then
+drawn over the viewport by ``draw_hud()``.
+"""
+from __future__ import division, print_function
+from collections import deque
+from timeit import default_timer
+
+from PyQt4.QtGui import *
+from PyQt4.QtCore import *
+
+from visuino.gx.text_metrics import TEXT_METRICS
+
+__all__ = ['FrameCounters', 'FrameStats', 'FRAME_STATS', 'draw_hud']
+
+class FrameCounters(object):
+    '''
+    Running totals of the work done on the hot paths of the blocks. They
+    are never reset; the views take the difference between two readings.
+
+    Attributes:
+        collision_tests: int. Notch collision tests (``collidesWithItem``).
+        update_metrics: int. Calls to ``updateMetrics()`` on blocks.
+        items_painted: int. Calls to ``paint()`` on blocks.
+    '''
+    COUNTERS = ('collision_tests', 'update_metrics', 'items_painted')
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+
+    def getCounts(self):
+        ''' () -> dict
+
+        Current value of each counter, by name.
+        '''
+        return dict((name, getattr(self, name)) for name in self.COUNTERS)
+
+
+class FrameStats(object):
+    '''
+    Statistics of the frames painted by one view.
+
+    Attributes:
+        last_*: int. Value of each counter (see ``FrameCounters``) on the
+            last frame.
+        last_paint_time: float. Time (ms) spent painting the last frame.
+
+        frame_times: deque of float. Paint times (ms) of the last frames.
+        frame_stamps: deque of float. Moment (s) when those frames ended.
+    '''
+    #: Upper limits (ms) of the frame time histogram bins (the last bin,
+    #: beyond the last limit, is open)
+    HISTOGRAM_BINS = (4, 8, 16, 33, 66)
+
+    def __init__(self, history=240):
+        ''' (int) -> NoneType
+
+        The 'history' is how many frames are kept for the histogram.
+        '''
+        self.frame_times = deque(maxlen=history)
+        self.frame_stamps = deque(maxlen=history)
+        self.last_paint_time = 0.0
+
+        for name in FrameCounters.COUNTERS:
+            setattr(self, 'last_' + name, 0)
+
+    def endFrame(self, paint_time, counts):
+        ''' (float, dict) -> NoneType
+
+        Saves the statistics of the frame that has just been painted, taking
+        'paint_time' ms. The 'counts' maps the counter names to the work
+        done for that frame.
+        '''
+        self.frame_times.append(paint_time)
+        self.frame_stamps.append(default_timer())
+        self.last_paint_time = paint_time
+
+        for name, value in counts.items():
+            setattr(self, 'last_' + name, value)
+
+    def getFps(self):
+        ''' () -> int
+
+        Number of frames painted on the last second.
+        '''
+        limit = default_timer() - 1.0
+        n = 0
+        for stamp in reversed(self.frame_stamps):
+            if stamp < limit:
+                break
+            n += 1
+        return n
+
+    def getHistogram(self):
+        ''' () -> list of int
+
+        Number of the last frames that fall on each bin of frame time
+        (see ``self.HISTOGRAM_BINS``).
+        '''
+        bins = [0] * (len(self.HISTOGRAM_BINS) + 1)
+        for t in self.frame_times:
+            i = 0
+            while i < len(self.HISTOGRAM_BINS) and t >= self.HISTOGRAM_BINS[i]:
+                i += 1
+            bins[i] += 1
+        return bins
+
+
+#: Counters shared by all the views and blocks of the application
+FRAME_STATS = FrameCounters()
+
+
+def draw_hud(painter, stats, pos=QPointF(10, 10)):
+    ''' (QPainter, FrameStats, QPointF) -> NoneType
+
+    Draws the statistics of the last frame, plus the frame time histogram,
+    on a translucent box whose top-left corner is 'pos' (in the painter
+    coordinates, usually the viewport ones).
+    '''
+    lines = ['FPS: %d' % stats.getFps(),
+             'Paint: %.1f ms' % stats.last_paint_time,
+             'Items painted: %d' % stats.last_items_painted,
+             'Collision tests: %d' % stats.last_collision_tests,
+             'updateMetrics: %d' % stats.last_update_metrics,
+             'Text cache hits: %.0f%%' % (100 * TEXT_METRICS.getHitRate())]
+    bins = stats.getHistogram()
+
+    font = QFont('Verdana', 8)
+    metrics = QFontMetricsF(font)
+    lh = metrics.height()
+    bar_w, bar_h = 24, 40
+    W = max(max(metrics.width(x) for x in lines), len(bins) * bar_w) + 16
+    H = len(lines) * lh + bar_h + lh + 20
+
+    painter.save()
+    painter.resetTransform()
+    painter.setRenderHint(QPainter.Antialiasing, False)
+    painter.fillRect(QRectF(pos.x(), pos.y(), W, H), QColor(0, 0, 0, 170))
+
+    painter.setFont(font)
+    painter.setPen(QColor('white'))
+    x, y = pos.x() + 8, pos.y() + 4
+    for text in lines:
+        y += lh
+        painter.drawText(QPointF(x, y - metrics.descent()), text)
+
+    # histogram: one bar for each frame time bin
+    total, y0 = max(sum(bins), 1), y + 8 + bar_h
+    labels = ['<%d' % b for b in stats.HISTOGRAM_BINS] + \
+             ['%d+' % stats.HISTOGRAM_BINS[-1]]
+    for i, count in enumerate(bins):
+        h = bar_h * count / total
+        painter.fillRect(QRectF(x + i*bar_w, y0 - h, bar_w - 4, h),
+                         QColor('lightgreen') if i < 3 else QColor('orange'))
+        painter.drawText(QRectF(x + i*bar_w - 2, y0, bar_w, lh),
+                         Qt.AlignCenter, labels[i])
+    painter.restore()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Deferred relayout of the blocks that contain other blocks.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+When the size of a block changes, its parent block (e.g. the function call
+holding an argument label) has to recompute its metrics too, and so on up
+to the top block. Doing it right away means that every ancestor is relaid
+out once per level of the change, and once again for each one of its
+children that changed on the same event.
+
+Instead, blocks call ``GxBlock.requestParentLayout()`` at the end of their
+``updateMetrics()``, which just marks the parent as dirty on the shared
+``LAYOUT_SCHEDULER``. Once control gets back to the event loop, the
+scheduler calls ``updateMetrics()`` on the dirty blocks, from the deepest up
+to the top ones, so each block is computed exactly once, after all of its
+children. ``flush()`` does the same immediately, for code that needs the
+final geometry before returning to the event loop (e.g. rendering a scene
+right after loading it).
+"""
+from __future__ import division, print_function
+import heapq
+
+from PyQt4.QtGui import *
+from PyQt4.QtCore import *
+
+from visuino.utils import trace_register
+
+__all__ = ['GxLayoutScheduler', 'LAYOUT_SCHEDULER']
+
+class GxLayoutScheduler(object):
+    '''
+    Dirty-flag scheduler of ``updateMetrics()`` calls.
+
+    Attributes:
+        passes: int. Number of layout passes done so far.
+        relayouts: int. Number of blocks relaid out by those passes.
+
+        _pending: list. Heap of (-depth, sequence, block) of the dirty
+            blocks, so the deepest ones come first.
+        _scheduled: bool. A flush() is already queued on the event loop.
+        _flushing: bool. A flush() is running.
+        _next: list of GxBlock. Blocks marked again, during the running
+            pass, after being computed; left for the next pass.
+    '''
+    def __init__(self):
+        self._pending = []
+        self._next = []
+        self._sequence = 0
+        self._scheduled = False
+        self._flushing = False
+        self.passes = self.relayouts = 0
+
+    @staticmethod
+    def _getDepth(item):
+        ''' (QGraphicsItem) -> int
+        '''
+        depth, parent = 0, item.parentItem()
+        while parent is not None:
+            depth, parent = depth + 1, parent.parentItem()
+        return depth
+
+    def markDirty(self, block):
+        ''' (GxBlock) -> NoneType
+
+        Schedules 'block.updateMetrics()' for the next layout pass. Marking
+        a block that is already dirty does nothing.
+        '''
+        if block._layout_dirty:
+            return
+        block._layout_dirty = True
+        self._sequence += 1
+        heapq.heappush(self._pending,
+                       (-self._getDepth(block), self._sequence, block))
+
+        if not self._scheduled and not self._flushing:
+            self._scheduled = True
+            QTimer.singleShot(0, self.flush)
+
+    def isPending(self):
+        ''' () -> bool
+        '''
+        return bool(self._pending)
+
+    def flush(self):
+        ''' () -> NoneType
+
+        Relays out all the dirty blocks, children before parents. The
+        parents marked by those updates are done on the same pass.
+        '''
+        self._scheduled = False
+        if self._flushing or not self._pending:
+            return
+
+        self._flushing = True
+        done = set()
+        try:
+            while self._pending:
+                block = heapq.heappop(self._pending)[2]
+                if not block._layout_dirty:
+                    # updated meanwhile by a direct updateMetrics() call
+                    continue
+                if block.scene() is None:
+                    # removed from the scene before its turn
+                    block._layout_dirty = False
+                    continue
+                if block in done:
+                    self._next.append(block)
+                    continue
+                done.add(block)
+                block._layout_dirty = False
+                block.updateMetrics()
+                self.relayouts += 1
+        finally:
+            self._flushing = False
+            self.passes += 1
+
+        # blocks marked again after being computed go to the next pass
+        next_blocks, self._next = self._next, []
+        for block in next_blocks:
+            block._layout_dirty = False
+            self.markDirty(block)
+
+trace_register(GxLayoutScheduler, ('flush',), 'gx')
+
+
+#: Scheduler shared by all the blocks of the application
+LAYOUT_SCHEDULER = GxLayoutScheduler()
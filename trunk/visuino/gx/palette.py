@@ -20,10 +20,12 @@ from PyQt4.QtCore import *
 
 from visuino.gx.bases import *
 from visuino.gx.blocks import *
+from visuino.gx.cache_policy import GxCachePolicy
 from visuino.resources import *
 
 from visuino.core.sketch import SketchBlocks
 from visuino.core.lib_defs import LibraryDefinitions
+from visuino.utils import trace_register
 
 from pprint import pprint
 
@@ -51,13 +53,17 @@ class GxPaletteSection(QGraphicsItem):
         
         self.setPos(start_pos)
                 
+        # blocks shown while the palette is filtered (None: all of them)
+        self._filter = None
+
         self._blocks = []
         for definition in self._defs:
             new_block = GxBlockFunctionCall(definition, self.scene())
             new_block.setPos(5 if definition['return_type'] else 15, 0)
             new_block.setCacheMode(QGraphicsItem.DeviceCoordinateCache)                
+            # icons are only cloned, they never get dragged or plugged
+            new_block.mouse_active = False
             self._blocks.append(new_block)
-            self._total_height += new_block.getHeight() + self._spacing
 
         self._updateBlocksPosition() 
         self._collapsed = True
@@ -70,12 +76,21 @@ class GxPaletteSection(QGraphicsItem):
     @property
     def title(self):
         return self._title
+
+    @property
+    def blocks(self):
+        return self._blocks
+
+    def isCollapsed(self):
+        return self._collapsed
         
     @property
     def bottom(self):
         return self.y() + self.getTotalHeight()        
         
     def getTotalHeight(self):
+        if not self.isVisible():
+            return 0
         if self._collapsed:
             return self._height + self.SPACING_SECTION
         else:
@@ -102,22 +117,47 @@ class GxPaletteSection(QGraphicsItem):
                 self.collapse()
                 
     def expand(self):       
-        for block in self._blocks:                      
-            block.show()
-        self._collapsed = False 
-        self._palette_lib.updateSectionsBelow(self)
+        self.setExpanded(True)
 
     def collapse(self):
+        self.setExpanded(False)
+
+    def setExpanded(self, expanded, update_below=True):
+        ''' (bool, bool) -> NoneType
+
+        Shows (only the ones passing the filter) or hides the blocks. Only
+        the blocks whose visibility changes are touched.
+        '''
+        self._collapsed = not expanded
         for block in self._blocks:
-            block.hide()
-        self._collapsed = True
-        self._palette_lib.updateSectionsBelow(self)
+            visible = expanded and (self._filter is None or
+                                    block in self._filter)
+            if block.isVisible() != visible:
+                block.setVisible(visible)
+        if update_below:
+            self._palette_lib.updateSectionsBelow(self)
+
+    def setFilter(self, blocks=None, expanded=None):
+        ''' (set of GxBlock, bool) -> NoneType
+
+        Restricts the blocks shown by this section to 'blocks' (None shows
+        all of them again), also expanding or collapsing it if 'expanded'
+        is given. Does not update the sections below.
+        '''
+        self._filter = blocks
+        self._updateBlocksPosition()
+        self.setExpanded(not self._collapsed if expanded is None
+                         else expanded, False)
         
     def _updateBlocksPosition(self):
         y_blocks = self.y() + self._height + self._spacing
+        self._total_height = self._height + self._spacing
         for block in self._blocks:                      
+            if self._filter is not None and block not in self._filter:
+                continue
             block.setPos(block.x(), y_blocks)
             y_blocks += block.getHeight() + self._spacing
+            self._total_height += block.getHeight() + self._spacing
         
     def updatePosY(self, y):
         self.setPos(self.x(), y)
@@ -155,9 +195,24 @@ class GxPaletteResizer(QGraphicsItem):
         
 
 class GxPaletteLibrary(GxView):
-    
+    '''
+    View of the blocks of a library, organized in collapsible sections. It
+    is embedded on the blocks scene through ``GxPalette`` (a proxy widget),
+    so everything it paints goes through the proxy - only the bounding rect
+    of the changed items is repainted (BoundingRectViewportUpdate), and the
+    viewport is never an Open GL one, which can not be drawn by a proxy.
+
+    A search field sits above the viewport. As the user types, only the
+    blocks whose name (or section title) contains the text are shown (see
+    ``self.filterBlocks()``).
+    '''
+    #: Height (pixels) of the search field
+    SEARCH_HEIGHT = 24
+
     def __init__(self, lib_name, gx_palette, opengl):
         ''' (str, dict, GxPalette, bool)
+
+        The 'opengl' flag is ignored (see the class docstring).
         '''                
         self.lib_name = lib_name
         self.gx_palette = gx_palette
@@ -166,12 +221,18 @@ class GxPaletteLibrary(GxView):
         self._scene.style = self.gx_palette.scene().style
         self._scene.setBackgroundBrush(QBrush(QColor(208, 214, 219)))
         self._scene.setSceneRect(0, 0, 500, 2000)
+        self._scene.auto_grow = False
         
-        GxView.__init__(self, self._scene, None, opengl)
+        GxView.__init__(self, self._scene, None, False)
 
         self.setDragMode(QGraphicsView.NoDrag)
         self.setFrameStyle(QFrame.NoFrame)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        self.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
+
+        self.search_field = QLineEdit(self)
+        self.search_field.setPlaceholderText('Search blocks...')
+        self.search_field.textChanged[str].connect(self.filterBlocks)
+        self.setViewportMargins(0, self.SEARCH_HEIGHT, 0, 0)
             
         self._sections = []
         
@@ -187,19 +248,85 @@ class GxPaletteLibrary(GxView):
         menu.addAction("Expand all", self.expandAll)
         menu.addAction("Collapse all", self.collapseAll)
         self.menu_expand_collapse_all = menu    
+
+        self._buildSearchIndex()
         
 #        self.scale(0.85, 0.85)   
+
+    def resizeEvent(self, event):
+        ''' QGraphicsView.resizeEvent(QResizeEvent) -> NoneType
+        '''
+        GxView.resizeEvent(self, event)
+        self.search_field.setGeometry(0, 0, self.width(), self.SEARCH_HEIGHT)
+
+    def _buildSearchIndex(self):
+        ''' () -> NoneType
+
+        Indexes the lower case name and section title of every block icon,
+        on the palette order.
+        '''
+        self._search_index = []
+        for section in self._sections:
+            title = section.title.lower()
+            for block in section.blocks:
+                self._search_index.append(
+                    (block.definition['name'].lower(), title, section, block))
+
+        self._search_text = ''
+        self._search_matches = self._search_index
+        self._collapsed_before = None
+
+    def filterBlocks(self, text):
+        ''' (str) -> NoneType
+
+        Shows only the blocks whose name or section title contains 'text'
+        (ignoring case), expanding the sections that have any of them and
+        hiding the others. An empty text restores the palette as it was
+        before the search. When the text just grows, only the previous
+        matches are searched again.
+        '''
+        text = type(u'')(text).strip().lower()
+        if text == self._search_text:
+            return
+
+        if not text:
+            matches = self._search_index
+        elif self._search_text and text.startswith(self._search_text):
+            matches = [x for x in self._search_matches
+                       if text in x[0] or text in x[1]]
+        else:
+            matches = [x for x in self._search_index
+                       if text in x[0] or text in x[1]]
+
+        if text and not self._search_text:
+            self._collapsed_before = [s.isCollapsed() for s in self._sections]
+        self._search_text, self._search_matches = text, matches
+
+        found = {}
+        for name, title, section, block in matches:
+            found.setdefault(section, set()).add(block)
+
+        for i, section in enumerate(self._sections):
+            if text:
+                section.setVisible(section in found)
+                section.setFilter(found.get(section, set()), True)
+            else:
+                section.setVisible(True)
+                section.setFilter(None, not self._collapsed_before[i])
+
+        if self._sections:
+            self._sections[0].updatePosY(0)
+            self.updateSectionsBelow(self._sections[0])
+        self.centerOn(0, 0)
     
     def expandAll(self):
         for sec in self._sections:
             sec.expand()
-        self.gx_palette.update(self.gx_palette.boundingRect())
             
     def collapseAll(self):
         for sec in self._sections:
             sec.collapse()
         self.centerOn(0, 0)
-        self.gx_palette.update(self.gx_palette.boundingRect()) 
     
     def updateSectionsBelow(self, section):
         ''' (GxPaletteSection)
@@ -219,7 +346,6 @@ class GxPaletteLibrary(GxView):
         '''
         super(GxPaletteLibrary, self).mousePressEvent(event) 
         
-        self.gx_palette.update(self.gx_palette.boundingRect()) 
         item_at = self.itemAt(event.pos())                
         
         if (isinstance(item_at, GxBlock) and 
@@ -228,36 +354,41 @@ class GxPaletteLibrary(GxView):
             block_icon = item_at
             if item_at.parentItem():
                 block_icon = item_at.parentItem()
-    
-            new_block = block_icon.cloneMe(self.gx_palette.scene())
-            new_block.sketch = self.gx_palette.sketch
-            self.gx_palette.sketch.addSnippet(new_block)
-                        
-            new_block.setFlags(QGraphicsItem.ItemIsMovable)
-            new_block.setCacheMode(QGraphicsItem.ItemCoordinateCache)
-            new_block.setCursor(Qt.OpenHandCursor)
-            
-            new_block.palette_blocks = self.gx_palette
-            new_block.new_block = True
-            
-#            my_pos = self.mapTo(self.gx_palette.widget(), self.pos())                        
-            icon_mapped_pos = self.mapFromScene(block_icon.pos())
-            new_block.setPos(QPointF(
-                self.gx_palette.pos().x() + icon_mapped_pos.x() + 2,
-                self.gx_palette.pos().y() + icon_mapped_pos.y() + 2))
-            
-            self.gx_palette.scene().bringToFront(new_block)
-            
-            new_block.grabMouse()
-            
-    def mouseReleaseEvent(self, event):
-        ''' QGraphicsProxyWidget.mouseReleaseEvent(
-                QGraphicsSceneMouseEvent) -> None
+
+            self.cloneBlock(block_icon).grabMouse()
+
+    def cloneBlock(self, block_icon):
+        ''' (GxBlock) -> GxPluggableBlock
+
+        Creates a copy of 'block_icon' on the blocks scene, right over the
+        icon and ready to be dragged, as a new snippet of the sketch.
         '''
-        super(GxPaletteLibrary, self).mouseReleaseEvent(event)
-        self.gx_palette.update(self.gx_palette.boundingRect())         
-        
-        
+        new_block = block_icon.cloneMe(self.gx_palette.scene())
+        new_block.sketch = self.gx_palette.sketch
+        self.gx_palette.sketch.addSnippet(new_block)
+
+        new_block.setFlags(QGraphicsItem.ItemIsMovable)
+        if new_block.scene().cache_policy:
+            new_block.scene().cache_policy.apply(new_block)
+        else:
+            new_block.setCacheMode(QGraphicsItem.ItemCoordinateCache)
+        new_block.setCursor(Qt.OpenHandCursor)
+
+        new_block.palette_blocks = self.gx_palette
+        new_block.new_block = True
+
+        icon_mapped_pos = self.viewport().mapTo(self,
+                                    self.mapFromScene(block_icon.pos()))
+        new_block.setPos(QPointF(
+            self.gx_palette.pos().x() + icon_mapped_pos.x() + 2,
+            self.gx_palette.pos().y() + icon_mapped_pos.y() + 2))
+
+        self.gx_palette.scene().bringToFront(new_block)
+        return new_block
+
+trace_register(GxPaletteLibrary, ('cloneBlock',), 'palette')
+
+
 class GxPalette(QGraphicsProxyWidget):
     MINIMUM_WIDTH = 200
     MAXIMUM_WIDTH = 400
@@ -289,8 +420,16 @@ class GxPalette(QGraphicsProxyWidget):
         
         self.setAcceptHoverEvents(True)        
 
+    def _itemAt(self, pos):
+        ''' (QPointF) -> QGraphicsItem
+
+        Item of the palette view under 'pos' (proxy coordinates).
+        '''
+        return self._view.itemAt(
+            self._view.viewport().mapFrom(self._view, pos.toPoint()))
+
     def hoverMoveEvent(self, event):
-        item_at = self._view.itemAt(event.pos().toPoint())
+        item_at = self._itemAt(event.pos())
         if isinstance(item_at, GxPaletteSection):
             self.setCursor(Qt.PointingHandCursor)
         elif isinstance(item_at, GxBlock):
@@ -319,8 +458,7 @@ class GxPalette(QGraphicsProxyWidget):
     def mousePressEvent(self, event):
         super(GxPalette, self).mousePressEvent(event)
         
-        if (isinstance(self._view.itemAt(event.pos().toPoint()), 
-                       GxPaletteSection) and 
+        if (isinstance(self._itemAt(event.pos()), GxPaletteSection) and 
             event.button() == Qt.RightButton):
             
             self._view.menu_expand_collapse_all.popup(event.screenPos())            
@@ -335,6 +473,7 @@ class GxViewPalette(GxView):
         
         self.libs = LibraryDefinitions()
         self.sketch = SketchBlocks(self.libs)
+        self.scene().cache_policy = GxCachePolicy(self.scene())
 
         self.scene().setSceneRect(0, 0, 2000, 4000)
         self.scene().setParent(self)
@@ -356,7 +495,34 @@ class GxViewPalette(GxView):
         '''
         QGraphicsView.resizeEvent(self, event)
         self.palette_blocks.updateHeight(self.height())
-        
+
+    def keyPressEvent(self, event):
+        ''' GxView.keyPressEvent(QKeyEvent) -> NoneType
+
+        Operations on the selected blocks: Delete removes them, Ctrl+D
+        duplicates them and the arrow keys move them (1 unit, or a grid
+        step with Shift).
+        '''
+        scene = self.scene()
+        selected = scene.selectedItems()
+        if not selected or scene.focusItem() is self.palette_blocks:
+            GxView.keyPressEvent(self, event)
+            return
+
+        step = scene.GRID_SIZE if event.modifiers() & Qt.ShiftModifier else 1
+        moves = {Qt.Key_Left: (-step, 0), Qt.Key_Right: (step, 0),
+                 Qt.Key_Up: (0, -step), Qt.Key_Down: (0, step)}
+
+        if event.key() == Qt.Key_Delete:
+            scene.removeItems(selected)
+        elif event.key() == Qt.Key_D and \
+             event.modifiers() & Qt.ControlModifier:
+            scene.duplicateItems(selected)
+        elif event.key() in moves:
+            scene.moveItems(selected, QPointF(*moves[event.key()]))
+        else:
+            GxView.keyPressEvent(self, event)
+
     def mousePressEvent(self, event):
         ''' GxView.mousePressEvent(event) -> NoneType
         '''
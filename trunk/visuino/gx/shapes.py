@@ -23,6 +23,7 @@ attributes by using a simple GUI.
 
 from __future__ import division, print_function
 import sys
+from collections import OrderedDict
 if __name__ == '__main__':
     sys.path.append('../../')
 
@@ -35,6 +36,26 @@ from visuino.utils import vlarg
 
 __all__ = ['CornerPath', 'NotchPath']
 
+#: Maximum number of path templates kept by each class (see _connect())
+TEMPLATE_CACHE_SIZE = 256
+
+def _connect(path, templates, key, build):
+    ''' (QPainterPath, OrderedDict, tuple, function) -> NoneType
+
+    Connects to 'path' the template (a path starting at the origin) stored
+    on 'templates' under 'key', translated to the current position. If not
+    there yet, the template is created by calling 'build()', dropping the
+    least recently used one when 'templates' is full.
+    '''
+    template = templates.pop(key, None)
+    if template is None:
+        template = build()
+        if len(templates) >= TEMPLATE_CACHE_SIZE:
+            templates.popitem(last=False)
+    templates[key] = template
+    path.connectPath(template.translated(path.currentPosition()))
+
+
 class CornerPath(GxPainterPath):
     '''    
     Path with the shape of a corner to be connected with other paths.
@@ -67,6 +88,10 @@ class CornerPath(GxPainterPath):
     VALID_PLACES = ('bottom-left', 'bottom-right', 'top-left', 'top-right')
     VALID_SHAPES = ('trig', 'arc', 'rect')
 
+    # corners already built at the origin, by (width, height, shape, place,
+    # clockwise) - see connect()
+    _templates = OrderedDict()
+
     def __init__(self, start_point, rect_size, shape, place, clockwise=True):
         '''        
         :param start_point: ``QPointF``
@@ -180,9 +205,16 @@ class CornerPath(GxPainterPath):
             Indicates what kind of corner this will be on the final picture.
         :param clockwise: ``bool``
             Direction of the drawing. 
+
+        The corner is built (and its arguments validated) only the first
+        time for each combination of arguments; after that, a cached copy
+        is just translated to the current position.
         '''
-        path.connectPath(CornerPath(path.currentPosition(), rect_size,
-                                    shape, place, clockwise))
+        key = (rect_size.width(), rect_size.height(), shape, place,
+               clockwise)
+        _connect(path, CornerPath._templates, key,
+                 lambda: CornerPath(QPointF(0, 0), rect_size, shape, place,
+                                    clockwise))
 
 
 class NotchPath(GxPainterPath):
@@ -235,6 +267,10 @@ class NotchPath(GxPainterPath):
                         '-j')   # vertical up right                        
     VALID_FACING_SIDES = ('up', 'down', 'left', 'right')
 
+    # notches already built at the origin, by (width, height, shape,
+    # direction, facing) - see connect()
+    _templates = OrderedDict()
+
     def __init__(self, start_point, rect_size, shape, direction, facing):
         '''
         :param start_point: ``QPointF``
@@ -387,9 +423,15 @@ class NotchPath(GxPainterPath):
         :param facing: ``str`` in ``self.VALID_FACING_SIDES``
             Indicates to which side the top of the trapezium is going to be
             pointing on.
+
+        As with ``CornerPath.connect()``, the notch is built only once for
+        each combination of arguments and then translated from a cache.
         '''
-        path.connectPath(NotchPath(path.currentPosition(),
-                                   rect_size, shape, direction, facing))
+        key = (rect_size.width(), rect_size.height(), shape, direction,
+               facing)
+        _connect(path, NotchPath._templates, key,
+                 lambda: NotchPath(QPointF(0, 0), rect_size, shape,
+                                   direction, facing))
 
 class GxExamplePaths(QGraphicsItem):
     '''
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Process-wide cache of fonts and text measurements, shared by
+#              the metrics updates of all the blocks.
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+The blocks measure their texts on every ``updateMetrics()``, which used to
+mean building a ``QFont`` and a ``QFontMetricsF`` and measuring the same
+names again and again. ``TEXT_METRICS`` keeps the fonts and metrics objects
+(one per family, size and weight) and the size of the measured texts, the
+least recently used ones of each kind being dropped when it gets full::
+
+    font = TEXT_METRICS.getFont('Verdana', 12)
+    w, h = TEXT_METRICS.getTextSize('Verdana', 12, -1, 'digitalWrite')
+    w, h = TEXT_METRICS.getFontTextSize(widget.font(), widget.text())
+
+Everything is dropped when the styles change (see
+``visuino.settings.StyleStore``).
+"""
+from __future__ import division, print_function
+from collections import OrderedDict
+
+from PyQt4.QtGui import *
+from PyQt4.QtCore import *
+
+from visuino.settings import STYLES
+
+__all__ = ['TextMetricsCache', 'TEXT_METRICS']
+
+class TextMetricsCache(object):
+    '''
+    LRU cache of text sizes, keyed by (family, size, weight, text).
+
+    Attributes:
+        max_size: int. Maximum number of measured texts kept.
+        max_fonts: int. Maximum number of fonts kept.
+        hits, misses: int. Lookups of text sizes since the last clear().
+
+        _fonts: OrderedDict. (family, size, weight) or QFont.key() ->
+            (QFont, QFontMetricsF), on the order of the last use.
+        _sizes: OrderedDict. (font key, text) -> (width, height), on the
+            order of the last use (most recent at the end).
+        _style_version: int. Style version of the cached values.
+    '''
+    def __init__(self, max_size=2048, max_fonts=64):
+        ''' (int, int) -> NoneType
+        '''
+        self.max_size = max_size
+        self.max_fonts = max_fonts
+        self._fonts = OrderedDict()
+        self._sizes = OrderedDict()
+        self.clear()
+
+    def clear(self):
+        ''' () -> NoneType
+
+        Drops all the cached values and resets the statistics.
+        '''
+        self._fonts.clear()
+        self._sizes.clear()
+        self.hits = self.misses = 0
+        self._style_version = STYLES.getVersion()
+
+    def _checkStyle(self):
+        ''' () -> NoneType
+        '''
+        if self._style_version != STYLES.getVersion():
+            self.clear()
+
+    def _getEntry(self, family, size, weight):
+        ''' (str, int, int) -> tuple of (QFont, QFontMetricsF)
+        '''
+        return self._getFontEntry((family, size, weight),
+                                  lambda: QFont(family, size, weight))
+
+    def _getFontEntry(self, key, build):
+        ''' (object, function) -> tuple of (QFont, QFontMetricsF)
+        '''
+        entry = self._fonts.pop(key, None)
+        if entry is None:
+            font = build()
+            entry = (font, QFontMetricsF(font))
+            if len(self._fonts) >= self.max_fonts:
+                self._fonts.popitem(last=False)
+        self._fonts[key] = entry
+        return entry
+
+    def _getSize(self, key, text, get_entry):
+        ''' (object, unicode, function) -> tuple of (float, float)
+        '''
+        self._checkStyle()
+        size_key = (key, text)
+        value = self._sizes.pop(size_key, None)
+        if value is None:
+            self.misses += 1
+            metrics = get_entry()[1]
+            value = (metrics.width(text), metrics.height())
+            if len(self._sizes) >= self.max_size:
+                self._sizes.popitem(last=False)
+        else:
+            self.hits += 1
+        self._sizes[size_key] = value
+        return value
+
+    def getFont(self, family, size, weight=-1):
+        ''' (str, int, int) -> QFont
+
+        The returned font is shared, so it must not be modified.
+        '''
+        self._checkStyle()
+        return self._getEntry(family, size, weight)[0]
+
+    def getMetrics(self, family, size, weight=-1):
+        ''' (str, int, int) -> QFontMetricsF
+        '''
+        self._checkStyle()
+        return self._getEntry(family, size, weight)[1]
+
+    def getTextSize(self, family, size, weight, text):
+        ''' (str, int, int, str) -> tuple of (float, float)
+
+        Width and height of 'text' written with the given font.
+        '''
+        return self._getSize((family, size, weight), text,
+                             lambda: self._getEntry(family, size, weight))
+
+    def getFontTextSize(self, font, text):
+        ''' (QFont, str) -> tuple of (float, float)
+
+        Same as getTextSize(), for any font (e.g. the one of a widget, which
+        may have its size in pixels or a style). The font is identified by
+        its QFont.key(); a copy is kept, so it may change afterwards.
+        '''
+        key = type(u'')(font.key())
+        return self._getSize(key, type(u'')(text),
+                             lambda: self._getFontEntry(key,
+                                                        lambda: QFont(font)))
+
+    def getFontTextWidth(self, font, text):
+        ''' (QFont, str) -> float
+        '''
+        return self.getFontTextSize(font, text)[0]
+
+    def getTextWidth(self, family, size, weight, text):
+        ''' (str, int, int, str) -> float
+        '''
+        return self.getTextSize(family, size, weight, text)[0]
+
+    def getHitRate(self):
+        ''' () -> float
+
+        Fraction (0 to 1) of the text size lookups answered from the cache.
+        '''
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def getStats(self):
+        ''' () -> dict
+
+        Keys: 'hits', 'misses', 'hit_rate', 'texts' and 'fonts'.
+        '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.getHitRate(), 'texts': len(self._sizes),
+                'fonts': len(self._fonts)}
+
+
+#: Cache shared by all the blocks of the application
+TEXT_METRICS = TextMetricsCache()
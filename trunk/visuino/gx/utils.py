@@ -12,6 +12,7 @@
 #-------------------------------------------------------------------------------
 from __future__ import division, print_function
 import sys
+from collections import OrderedDict
 if __name__ == '__main__':
     sys.path.append('../../')
 
@@ -20,9 +21,10 @@ from PyQt4.QtCore import *
 from PyQt4.QtSvg import *
 
 from visuino.gx.bases import *
+from visuino.settings import STYLES
 
-__all__ = ['GxPainterPath', 'GxProxyToFront', 'item_to_svg', 
-           'GxOutlinedText']
+__all__ = ['GxPainterPath', 'GxProxyToFront', 'item_to_svg', 'scene_to_svg',
+           'scene_to_image', 'GxOutlinedText']
 
 class GxPainterPath(QPainterPath):
     '''
@@ -99,7 +101,16 @@ class GxProxyToFront(QGraphicsProxyWidget):
 class GxOutlinedText(QGraphicsPathItem):
     '''
     Label that display outlined text.
+
+    The glyph outlines of each (text, font) are computed just once and
+    shared by all the instances (see getGlyphPath()).
     '''
+    # maximum number of entries on _glyph_paths (the least recently used
+    # ones are dropped)
+    GLYPH_CACHE_SIZE = 256
+
+    _glyph_paths = OrderedDict()
+
     def __init__(self, text, font, scene, parent=None, **kwargs):
         '''
         :param text: ``str``
@@ -115,9 +126,8 @@ class GxOutlinedText(QGraphicsPathItem):
         
         self._outline_width = kwargs.get('outline_width', 1)
         
-        path = QPainterPath(QPointF(0, 0))
-        path.addText(path.currentPosition(), self._font, self._text)
-        
+        path = self.getGlyphPath(self._text, self._font)
+
         QGraphicsPathItem.__init__(self, path, parent, scene)
         self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
         self.setGraphicsEffect(self._effect)
@@ -131,6 +141,37 @@ class GxOutlinedText(QGraphicsPathItem):
     def setPos(self, x, y):
         QGraphicsPathItem.setPos(self, x, y+self.boundingRect().height())
 
+    @classmethod
+    def getGlyphPath(cls, text, font):
+        '''
+        :param text: ``str``
+        :param font: ``QFont``
+        :return: ``QPainterPath`` - Outline of 'text' written with 'font',
+                 starting at (0, 0). Comes from the cache when possible.
+        '''
+        key = (text, font.toString())
+        path = cls._glyph_paths.pop(key, None)
+        if path is None:
+            if len(cls._glyph_paths) >= cls.GLYPH_CACHE_SIZE:
+                cls._glyph_paths.popitem(last=False)
+            path = QPainterPath(QPointF(0, 0))
+            path.addText(path.currentPosition(), font, text)
+        cls._glyph_paths[key] = path
+        return path
+
+    @classmethod
+    def prewarm(cls):
+        '''
+        Computes ahead the glyph paths of the start and end labels defined
+        on ``VGS['styles']['block_start_end']`` (not called at start-up, as
+        nothing uses these labels outlined yet).
+        '''
+        style = STYLES.getStyle('block_start_end')
+        font = style.font.qfont
+        for key in ('start_label_text', 'end_label_text'):
+            if key in style:
+                cls.getGlyphPath(style[key], font)
+
     
 def test_outlined_text():
     app = QApplication([])
@@ -155,15 +196,60 @@ def item_to_svg(gx_item, filename):
 
     Prints the drawing of a graphics item onto a SVG file.
     '''
-    svg_gen = QtSvg.QSvgGenerator()
+    rect = gx_item.boundingRect()
+    svg_gen = QSvgGenerator()
     svg_gen.setFileName(filename)
-    svg_gen.setSize(QtCore.QSize(gx_item._width, gx_item._height))
-    svg_gen.setViewBox(QtCore.QRect(0, 0, gx_item._width, gx_item._height))
+    svg_gen.setSize(rect.size().toSize())
+    svg_gen.setViewBox(rect)
 
-    painter = QtGui.QPainter()
+    painter = QPainter()
     painter.begin(svg_gen)
     gx_item.paint(painter)
     painter.end()
-    
+
+def scene_to_svg(scene, filename, source=None, size=None):
+    ''' (QGraphicsScene, str, QRectF, QSize) -> NoneType
+
+    Prints the 'source' region of the scene (by default, the bounding rect
+    of all its items) onto a SVG file of the given size (by default, the
+    size of 'source'). Unlike item_to_svg(), children items are included.
+
+    Items with a cache mode would be printed as bitmaps, so make sure to
+    set QGraphicsItem.NoCache on them before calling this.
+    '''
+    source = source or scene.itemsBoundingRect()
+    size = size or source.size().toSize()
+    svg_gen = QSvgGenerator()
+    svg_gen.setFileName(filename)
+    svg_gen.setSize(size)
+    svg_gen.setViewBox(QRect(QPoint(0, 0), size))
+
+    painter = QPainter()
+    painter.begin(svg_gen)
+    scene.render(painter, QRectF(QPointF(0, 0), QSizeF(size)), source,
+                 Qt.IgnoreAspectRatio)
+    painter.end()
+
+def scene_to_image(scene, source=None, size=None, background=None):
+    ''' (QGraphicsScene, QRectF, QSize, QColor) -> QImage
+
+    Renders the 'source' region of the scene (by default, the bounding rect
+    of all its items) onto a new image of the given size (by default, the
+    size of 'source'). If no 'background' color is given, the image will
+    be transparent outside the items.
+    '''
+    source = source or scene.itemsBoundingRect()
+    size = size or source.size().toSize()
+    image = QImage(size, QImage.Format_ARGB32_Premultiplied)
+    image.fill((background or QColor(Qt.transparent)).rgba())
+
+    painter = QPainter(image)
+    painter.setRenderHints(QPainter.Antialiasing |
+                           QPainter.TextAntialiasing |
+                           QPainter.SmoothPixmapTransform)
+    scene.render(painter, QRectF(image.rect()), source, Qt.IgnoreAspectRatio)
+    painter.end()
+    return image
+
 if __name__ == '__main__':
     test_outlined_text()
\ No newline at end of file
@@ -10,13 +10,18 @@
 # Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
 #              tribute ONLY as 100% free and keeping the credits.
 #-------------------------------------------------------------------------------
+import os, hashlib, json, tempfile
 import yaml
 
 from PyQt4.QtGui import *
 from PyQt4.QtCore import *
 
-# VISUINO GLOBAL SETTINGS
-VGS = {}
+#: Merged settings of the last load_settings(), to skip the YAML parsing
+SETTINGS_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.visuino',
+                                   'settings.cache')
+
+#: Must change whenever the cached data changes its layout
+SETTINGS_CACHE_FORMAT = 2
 
 DEFAULT_SETTINGS = \
 """
@@ -61,6 +66,11 @@ styles:
         arg_spacing: 0
         bottom_padd: 5
 
+        # level of detail (zoom) below which the block is drawn without
+        # text as a rounded rect (lod_simple) or as a flat rect (lod_flat)
+        lod_simple: 0.6
+        lod_flat: 0.3
+
     block_arg_label:
 
         background_color: 'yellow'
@@ -80,6 +90,9 @@ styles:
             horizontal: 10
             vertical: 5
 
+        lod_simple: 0.7
+        lod_flat: 0.35
+
     block_expression:
 
         background_color: 'green'
@@ -117,49 +130,430 @@ styles:
             
         start_label_text: 'Início'
         end_label_text: 'Fim'
+
+performance:
+
+    # memory (KB) for the item caches of the blocks (see gx/cache_policy.py)
+    pixmap_cache_kb: 32768
 """
 
-class StyleBlocks(dict):
+class CompiledStyle(object):
+    '''
+    Read-only view of a style section (a dict of VGS['styles']) with
+    attribute access, where the values are already converted into the Qt
+    objects used for painting:
+
+        * 'xxx_color' keys give a ``QColor``, along with the extra
+          attributes 'xxx_pen' (``QPen``) and 'xxx_brush' (``QBrush``);
+        * 'border_pen' uses 'border_width', with round caps and joins;
+        * 'font_family' + 'font_size' give a 'font' attribute (``QFont``),
+          the same for 'name_font_family' + 'name_font_size' ('name_font');
+        * sub-dicts with 'width' and 'height' give a ``QSizeF``, and the
+          other sub-dicts another ``CompiledStyle`` (those having 'family'
+          and 'size' also get a 'qfont' attribute).
+
+    The original values are still available by indexing, e.g.
+    style['border_color'] is the color string. The Qt objects are shared,
+    so they must not be modified either. Use STYLES.getStyle() to get the
+    current compiled version of a section.
+    '''
     def __init__(self, style_dict):
-        dict.__init__(self, style_dict)
-    
-    def getFont(self):
-        if 'font' not in self: return None
-        
-        font = QFont(self['font']['family'], self['font']['size'])
-        font.setBold(self['font']['bold'])
-        font.setItalic(self['font']['italic'])
-        
-        return font
-        
-    def getCornerSize(self):
-        return (self['corner_size']['width'], self['corner_size']['height'])    
-        
+        ''' (dict) -> NoneType
+        '''
+        attrs = {'_raw': dict(style_dict)}
+        for key, value in style_dict.items():
+            if isinstance(value, dict):
+                if set(value) == set(['width', 'height']):
+                    value = QSizeF(value['width'], value['height'])
+                else:
+                    value = CompiledStyle(value)
+            elif key.endswith('_color'):
+                value = QColor(value)
+                attrs.setdefault(key[:-6] + '_pen', QPen(value))
+                attrs.setdefault(key[:-6] + '_brush', QBrush(value))
+            attrs[key] = value
+
+        if 'border_color' in style_dict and 'border_width' in style_dict:
+            attrs['border_pen'] = QPen(attrs['border_brush'],
+                style_dict['border_width'], Qt.SolidLine, Qt.RoundCap,
+                Qt.RoundJoin)
+
+        for prefix in ('', 'name_'):
+            family, size = prefix + 'font_family', prefix + 'font_size'
+            if family in style_dict and size in style_dict and \
+                    prefix + 'font' not in style_dict:
+                attrs[prefix + 'font'] = QFont(style_dict[family],
+                                               style_dict[size])
+
+        if 'family' in style_dict and 'size' in style_dict:
+            font = QFont(style_dict['family'], style_dict['size'])
+            font.setBold(style_dict.get('bold', False))
+            font.setItalic(style_dict.get('italic', False))
+            attrs['qfont'] = font
+
+        self.__dict__.update(attrs)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('compiled styles are read-only')
+
+    def __getitem__(self, key):
+        return self._raw[key]
+
+    def __contains__(self, key):
+        return key in self._raw
+
+    def get(self, key, default=None):
+        return self._raw.get(key, default)
+
+    def paintPath(self, painter, path):
+        ''' (QPainter, QPainterPath) -> NoneType
+
+        Draws 'path' with the border pen, filled with the background brush.
+        '''
+        painter.setPen(self.border_pen)
+        painter.setBrush(self.background_brush)
+        painter.drawPath(path)
+
+    def paintText(self, painter, rect, flags, text, prefix=''):
+        ''' (QPainter, QRectF, Qt.Alignment, str, str) -> NoneType
+
+        Draws 'text' inside 'rect' with the (prefix + 'font') font and the
+        (prefix + 'font_color') color.
+        '''
+        painter.setFont(getattr(self, prefix + 'font'))
+        painter.setPen(getattr(self, prefix + 'font_pen'))
+        painter.drawText(rect, flags, text)
+
 
 class VisuinoGlobalSettings(dict):
     def __init__(self, start_dict={}):
         dict.__init__(self, start_dict)
         
     def getBlockStyle(self, block_name):
+        ''' (str) -> CompiledStyle
+        '''
         if block_name not in self['styles']:
             raise KeyError("'%s' is not a valid block!" % block_name)
             
-        sty = StyleBlocks(self['styles'][block_name])
+        return STYLES.getStyle(block_name)
+
+
+# VISUINO GLOBAL SETTINGS (filled by load_settings(); always updated in place,
+# since many modules hold a reference to it)
+VGS = VisuinoGlobalSettings()
+
+
+class StyleStore(object):
+    '''
+    Versioned access to the sections of VGS['styles'], with change
+    notifications per section.
+
+    Every change bumps the global version and the version of the changed
+    section, so caches derived from the styles (cached geometry, fonts) can
+    use them on their keys and get invalidated automatically. Subscribers
+    of a section are called as callback(section, key) after each change of
+    it, 'key' being the changed key or None when the whole section may have
+    changed (e.g. after loading a settings file).
+
+    Attributes:
+        version: int. Global version, bumped by every change.
+        _versions: dict. Section name -> version of that section.
+        _subscribers: dict. Section name -> list of callables.
+        _compiled: dict. Section name -> (version, CompiledStyle).
+    '''
+    def __init__(self):
+        self.version = 0
+        self._versions = {}
+        self._subscribers = {}
+        self._compiled = {}
+
+    def getVersion(self, *sections):
+        ''' (str, ...) -> int or tuple of int
+
+        Without arguments, the global version. Otherwise, the version of
+        the given section, or a tuple of versions for many sections.
+        '''
+        if not sections:
+            return self.version
+        if len(sections) == 1:
+            return self._versions.get(sections[0], 0)
+        return tuple(self._versions.get(x, 0) for x in sections)
+
+    def getStyle(self, section):
+        ''' (str) -> CompiledStyle
+
+        Compiled version of the given section, which is only rebuilt after
+        changes of the section.
+        '''
+        version = self._versions.get(section, 0)
+        entry = self._compiled.get(section)
+        if entry is None or entry[0] != version:
+            entry = (version, CompiledStyle(VGS['styles'][section]))
+            self._compiled[section] = entry
+        return entry[1]
+
+    def get(self, section, key):
+        ''' (str, str) -> object
 
+        Value of 'key' on the given section. Nested keys are joined by dots,
+        e.g. get('block_arg_label', 'padding.horizontal').
+        '''
+        value = VGS['styles'][section]
+        for k in key.split('.'):
+            value = value[k]
+        return value
+
+    def set(self, section, key, value):
+        ''' (str, str, object) -> NoneType
+
+        Changes the value of 'key' (see self.get()) on the given section
+        and notifies its subscribers. Setting the current value does nothing.
+        '''
+        keys = key.split('.')
+        style = VGS['styles'][section]
+        for k in keys[:-1]:
+            style = style[k]
+        if keys[-1] in style and style[keys[-1]] == value:
+            return
+        style[keys[-1]] = value
+        self.changed(section, key)
+
+    def changed(self, section=None, key=None):
+        ''' (str, str) -> NoneType
+
+        Bumps the versions and notifies the subscribers of 'section' (of all
+        the sections, if None). Must be called after modifying VGS['styles']
+        without self.set().
+        '''
+        self.version += 1
+        if section is None:
+            sections = set(self._versions) | set(self._subscribers)
+            if 'styles' in VGS:
+                sections.update(VGS['styles'])
+        else:
+            sections = [section]
+
+        for name in sections:
+            self._versions[name] = self.version
+        for name in sections:
+            for callback in list(self._subscribers.get(name, ())):
+                callback(name, key)
+
+    def subscribe(self, sections, callback):
+        ''' (str or list of str, callable) -> NoneType
+        '''
+        if isinstance(sections, str):
+            sections = [sections]
+        for name in sections:
+            self._subscribers.setdefault(name, []).append(callback)
+
+    def unsubscribe(self, sections, callback):
+        ''' (str or list of str, callable) -> NoneType
+        '''
+        if isinstance(sections, str):
+            sections = [sections]
+        for name in sections:
+            if callback in self._subscribers.get(name, ()):
+                self._subscribers[name].remove(callback)
+
+
+#: Store shared by the whole application
+STYLES = StyleStore()
+
+
+def _yaml_load(text):
+    ''' (str) -> object
+
+    Safe YAML parsing, using the libyaml based loader when available.
+    '''
+    return yaml.load(text, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+def _is_string(value):
+    return isinstance(value, (str, type(u'')))
+
+def _to_bytes(text):
+    return text if isinstance(text, bytes) else text.encode('utf-8')
+
+def merge_settings(base, override, source='', path=''):
+    ''' (dict, dict, str, str) -> dict
+
+    Returns a copy of 'base' with the values of 'override' (e.g. a theme
+    file) on top of it. Only the keys already present on 'base' are
+    accepted, and the values must keep their kind (section, number, bool
+    or string); otherwise ValueError is raised, naming the 'source' file
+    and the dotted path of the key.
+    '''
+    if not isinstance(override, dict):
+        raise ValueError("Settings '%s' on %s must be a section, but was "
+                         "given %r." % (path or '/', source or '?', override))
+    merged = dict(base)
+    for key, value in override.items():
+        key_path = path + '.' + str(key) if path else str(key)
+        if key not in base:
+            raise ValueError("Unknown setting '%s' on %s." %
+                             (key_path, source or '?'))
+        default = base[key]
+
+        if isinstance(default, dict):
+            merged[key] = merge_settings(default, value, source, key_path)
+            continue
+
+        if isinstance(default, bool):
+            valid = isinstance(value, bool)
+        elif isinstance(default, (int, float)):
+            valid = isinstance(value, (int, float)) and \
+                    not isinstance(value, bool)
+        elif _is_string(default):
+            valid = _is_string(value)
+        else:
+            valid = True
+        if not valid:
+            raise ValueError("Setting '%s' on %s must be like %r, but was "
+                             "given %r." % (key_path, source or '?', default,
+                                            value))
+        merged[key] = value
+    return merged
+
+def _cache_key(theme_files):
+    ''' (list of str) -> str
+
+    Hash of everything the merged settings depend on.
+    '''
+    sha = hashlib.sha1()
+    sha.update(_to_bytes('%d\n' % SETTINGS_CACHE_FORMAT))
+    sha.update(_to_bytes(DEFAULT_SETTINGS))
+    for filename in theme_files:
+        sha.update(b'\0' + _to_bytes(os.path.abspath(filename)) + b'\0')
+        with open(filename, 'rb') as stream:
+            sha.update(stream.read())
+    return sha.hexdigest()
+
+def _read_cache(cache_file, key):
+    ''' (str, str) -> dict <None>
+    '''
+    try:
+        with open(cache_file, 'rb') as stream:
+            cached = json.loads(stream.read().decode('utf-8'))
+    except Exception:
+        # missing, unreadable or corrupted
+        return None
+    if not isinstance(cached, dict) or cached.get('key') != key:
+        return None
+    return cached.get('settings')
+
+def _replace_file(source, target):
+    ''' (str, str) -> NoneType
+
+    Renames 'source' to 'target', replacing it atomically where the system
+    allows it (os.replace() is missing on Python 2, where os.rename() only
+    replaces existing files on POSIX systems).
+    '''
+    if hasattr(os, 'replace'):
+        os.replace(source, target)
+    else:
+        if os.name == 'nt' and os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+
+def _write_cache(cache_file, key, settings):
+    ''' (str, str, dict) -> NoneType
+
+    The settings are saved as JSON, written to a temporary file on the same
+    folder and then renamed, so a concurrent reader never sees a partial
+    file. Settings that JSON cannot represent as they are (e.g. non string
+    keys) are not cached. Failures are ignored: the cache only speeds the
+    next start up.
+    '''
+    data = json.dumps({'key': key, 'settings': settings}, sort_keys=True)
+    if json.loads(data)['settings'] != settings:
+        return
+
+    temp_file = None
+    try:
+        folder = os.path.dirname(cache_file) or '.'
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        fd, temp_file = tempfile.mkstemp(suffix='.tmp', dir=folder,
+            prefix=os.path.basename(cache_file) + '.')
+        with os.fdopen(fd, 'wb') as stream:
+            stream.write(_to_bytes(data))
+        _replace_file(temp_file, cache_file)
+        temp_file = None
+    except (IOError, OSError):
+        pass
+    finally:
+        if temp_file is not None:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
+
+# cache_file, key and settings parsed by a load_settings() that was told not
+# to write the cache (see save_settings_cache())
+_pending_cache = None
+
+def load_settings(theme_files=(), cache_file=SETTINGS_CACHE_FILE,
+                  write_cache=True):
+    ''' (list of str, str, bool) -> dict
+
+    Loads the default settings merged with the given theme files (YAML,
+    applied on order, see merge_settings()) into VGS, and returns it.
+
+    The merged result is saved on 'cache_file' (None disables it) along
+    with the hash of the defaults and of the theme files, so no YAML gets
+    parsed while none of them changes. If not 'write_cache', the cache is
+    only read; writing it is left for save_settings_cache().
+    '''
+    global _pending_cache
+    key = _cache_key(theme_files)
+    settings = _read_cache(cache_file, key) if cache_file else None
+
+    _pending_cache = None
+    if settings is None:
+        settings = _yaml_load(DEFAULT_SETTINGS)
+        for filename in theme_files:
+            with open(filename, 'rb') as stream:
+                theme = _yaml_load(stream.read().decode('utf-8'))
+            if theme is not None:
+                settings = merge_settings(settings, theme, filename)
+        if cache_file and write_cache:
+            _write_cache(cache_file, key, settings)
+        elif cache_file:
+            _pending_cache = (cache_file, key, settings)
+
+    VGS.clear()
+    VGS.update(settings)
+    STYLES.changed()
+    return VGS
+
+def save_settings_cache():
+    ''' () -> NoneType
+
+    Writes the cache skipped by the last load_settings(), if any.
+    '''
+    global _pending_cache
+    if _pending_cache is not None:
+        _write_cache(*_pending_cache)
+        _pending_cache = None
 
 def load_default():
-    global VGS, DEFAULT_SETTINGS
-    VGS = VisuinoGlobalSettings(yaml.safe_load(DEFAULT_SETTINGS))
+    ''' () -> NoneType
 
+    Runs when the package is imported, so it never writes the cache; the
+    application does it later (see save_settings_cache()).
+    '''
+    load_settings(write_cache=False)
 
 def load_config_file(filename):
-    global VGS
-    stream = open(filename, 'r')
-    VGS = yaml.load(stream)
-    stream.close()
+    ''' (str) -> NoneType
+
+    Loads the settings from 'filename' (merged over the defaults).
+    '''
+    load_settings([filename])
 
 def save_config_file(filename):
-    global VGS
-    stream = open(filename, 'w')
-    yaml.dump(VGS, stream)
-    stream.close()
+    ''' (str) -> NoneType
+    '''
+    with open(filename, 'w') as stream:
+        yaml.safe_dump(dict(VGS), stream,
+                       default_flow_style=False, allow_unicode=True)
@@ -2,4 +2,7 @@ from .validate import *
 del validate
 
 from .strings import *
-del strings
\ No newline at end of file
+del strings
+
+from .tracing import *
+del tracing
\ No newline at end of file
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Purpose:     Lightweight tracing of method calls, saved on the Chrome
+#              trace-event format (open it on chrome://tracing or Perfetto).
+#
+# Author:      Nelso G. Jost (nelsojost@gmail.com)
+#
+#              This file is part of VISUINO project - Copyright (C) 2013
+#
+# Licence:     GNU GPL. Its simple: use and modify as you please, and redis-
+#              tribute ONLY as 100% free and keeping the credits.
+#-------------------------------------------------------------------------------
+"""
+Modules declare which methods are worth tracing by calling ``trace_register()``
+right after the class definition::
+
+    trace_register(GxBlockFunctionCall, ('updateMetrics', 'paint'), 'gx')
+
+Registering does not touch the class. Only ``trace_start()`` replaces those
+methods by timing wrappers, and ``trace_stop()`` puts the originals back - so
+while tracing is off there is no overhead at all on the traced methods.
+"""
+from __future__ import division, print_function
+__all__ = ['trace_register', 'trace_start', 'trace_stop', 'trace_save',
+           'is_tracing']
+
+import os, json, threading
+from timeit import default_timer
+
+# (class, method name, category) of every registered method
+_REGISTRY = []
+
+# (class, method name, original attribute or None if it was inherited)
+_PATCHED = []
+
+# recorded spans, as (name, category, start, end, thread id)
+_SPANS = []
+
+#: Maximum number of spans kept on a single trace
+MAX_SPANS = 1000000
+
+_state = {'on': False, 't0': 0.0}
+
+def trace_register(cls, method_names, category='visuino'):
+    ''' (class, tuple of str, str) -> NoneType
+
+    Declares methods of 'cls' to be traced when tracing gets started. If it
+    is already on, they are instrumented right away.
+    '''
+    for name in method_names:
+        _REGISTRY.append((cls, name, category))
+        if _state['on']:
+            _patch(cls, name, category)
+
+def _patch(cls, name, category):
+    ''' (class, str, str) -> NoneType
+    '''
+    original = cls.__dict__.get(name)
+    func = getattr(cls, name)
+    span_name = cls.__name__ + '.' + name
+
+    def wrapper(*args, **kwargs):
+        start = default_timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if len(_SPANS) < MAX_SPANS:
+                _SPANS.append((span_name, category, start, default_timer(),
+                               threading.current_thread().ident))
+
+    wrapper.__name__, wrapper.__doc__ = func.__name__, func.__doc__
+    setattr(cls, name, wrapper)
+    _PATCHED.append((cls, name, original))
+
+def is_tracing():
+    ''' () -> bool
+    '''
+    return _state['on']
+
+def trace_start():
+    ''' () -> NoneType
+
+    Instruments all the registered methods and starts a new trace.
+    '''
+    if _state['on']:
+        return
+    del _SPANS[:]
+    _state['on'], _state['t0'] = True, default_timer()
+    for cls, name, category in _REGISTRY:
+        _patch(cls, name, category)
+
+def trace_stop():
+    ''' () -> int
+
+    Restores the original methods. The recorded spans are kept until the
+    next trace_start() (see trace_save()). Returns how many were recorded.
+    '''
+    if not _state['on']:
+        return len(_SPANS)
+    _state['on'] = False
+    # restoring on reverse order handles methods patched more than once
+    while _PATCHED:
+        cls, name, original = _PATCHED.pop()
+        if original is None:
+            delattr(cls, name)
+        else:
+            setattr(cls, name, original)
+    return len(_SPANS)
+
+def trace_save(filename):
+    ''' (str) -> NoneType
+
+    Writes the spans of the last trace on the Chrome trace-event JSON
+    format (complete "X" events, timestamps in microseconds).
+    '''
+    pid, t0 = os.getpid(), _state['t0']
+    events = [{'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+               'ts': (start - t0) * 1e6, 'dur': (end - start) * 1e6}
+              for name, cat, start, end, tid in _SPANS]
+
+    stream = open(filename, 'w')
+    json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, stream)
+    stream.close()